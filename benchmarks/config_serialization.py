@@ -0,0 +1,101 @@
+"""Benchmark of writing config files of a sweep with config_workers.
+
+Generates --experiments configs of a spec whose base config holds
+--base-size nested values, with every number of --workers (1 is the
+serial path), and reports the time until the last config path was
+yielded. The spec returns a list of experiments, or a Sweep with
+--compact-sweep. Run it on a machine with at least as many cores as
+workers.
+
+    python benchmarks/config_serialization.py --experiments 1000,50000 \\
+        --workers 1,2,4,8 --base-size 1000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from path import Path
+
+import mrunner.experiment
+from mrunner.experiment import generate_experiments
+
+SPEC = """
+from mrunner.helpers.specification_helper import create_experiments_helper
+
+experiments_list = create_experiments_helper(
+    experiment_name="bench",
+    project_name="bench/project",
+    script="python exp.py",
+    python_path=".",
+    tags=[],
+    base_config={{"table": {{f"key_{{i}}": [i] * 10 for i in range({base_size})}}}},
+    params_grid={{"index": list(range({experiments}))}},
+    with_neptune=False,
+    compact_sweep={compact_sweep},
+)
+"""
+
+
+def bench_case(root, experiments, workers, base_size, compact_sweep):
+    spec_path = os.path.join(root, f"spec_{experiments}.py")
+    with open(spec_path, "w") as f:
+        f.write(
+            SPEC.format(
+                experiments=experiments,
+                base_size=base_size,
+                compact_sweep=compact_sweep,
+            )
+        )
+    dump_dir = os.path.join(root, f"configs_{experiments}_{workers}")
+    os.makedirs(dump_dir)
+    # the spec module is cached between calls
+    mrunner.experiment._experiment_list = None
+    mrunner.experiment.get_experiments_list(spec_path, "experiments_list")
+
+    start = time.perf_counter()
+    count = 0
+    for _ in generate_experiments(
+        spec_path,
+        {"config_workers": workers},
+        spec="experiments_list",
+        dump_dir=Path(dump_dir),
+    ):
+        count += 1
+    elapsed = time.perf_counter() - start
+    assert count == len(os.listdir(dump_dir)) == experiments
+    return elapsed
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--experiments", type=_int_list, default=[1000, 50000])
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4, 8])
+    parser.add_argument("--base-size", type=int, default=1000)
+    parser.add_argument("--compact-sweep", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, base config of {args.base_size} keys")
+    print(f"{'experiments':>11} {'workers':>7} {'time [s]':>9} {'speedup':>7}")
+    with tempfile.TemporaryDirectory() as root:
+        for experiments in args.experiments:
+            serial = None
+            for workers in args.workers:
+                elapsed = bench_case(
+                    root, experiments, workers, args.base_size, args.compact_sweep
+                )
+                serial = serial or elapsed
+                print(
+                    f"{experiments:>11} {workers:>7} {elapsed:>9.2f}"
+                    f" {serial / elapsed:>7.2f}",
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
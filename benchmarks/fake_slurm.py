@@ -0,0 +1,281 @@
+"""In-process stand-in for a Slurm login node reached over SSH.
+
+FakeConnection replaces fabric.Connection in mrunner.backends.slurm: commands
+run locally with bash, "remote" paths are local paths (point storage_dir
+of the context at a temporary directory) and fake sbatch, squeue, sacct
+and scontrol commands come first on PATH. Every SSH round trip can be
+delayed by a fixed latency and dropped with a given probability, before
+the request reaches the cluster or after it was executed (lost response).
+
+    import fake_slurm
+    with fake_slurm.installed(latency=0.05, drop_rate=0.01) as cluster:
+        ...  # mrunner run with backend_type: slurm
+        print(cluster.round_trips, cluster.drops)
+
+Fake sbatch records jobs in the cluster's state dir and rejects arrays
+exceeding MaxArraySize; with execute=True it also runs every array task.
+All recorded tasks are reported as COMPLETED by sacct.
+"""
+
+import contextlib
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from invoke.exceptions import UnexpectedExit
+from invoke.runners import Result
+from paramiko.ssh_exception import SSHException
+
+import mrunner.backends.slurm as slurm_backend
+
+SBATCH = r"""#!/usr/bin/env bash
+array=""; exports=""; script=""
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --array) array="$2"; shift 2;;
+    --export=*) exports="${1#--export=}"; shift;;
+    --parsable) shift;;
+    -*) shift 2;;
+    *) script="$1"; shift;;
+  esac
+done
+last=${array##*-}; last=${last%%%*}
+if [ -n "$last" ] && [ "$last" -ge "$FAKE_SLURM_MAX_ARRAY_SIZE" ]; then
+  echo "sbatch: error: Batch job submission failed: Invalid job array specification" >&2
+  exit 1
+fi
+exec 9>> "$FAKE_SLURM_STATE/lock"; flock 9
+job_id=$(( $(cat "$FAKE_SLURM_STATE/last_job_id" 2>/dev/null || echo 1000) + 1 ))
+echo $job_id > "$FAKE_SLURM_STATE/last_job_id"
+echo "$array" > "$FAKE_SLURM_STATE/job_$job_id"
+flock -u 9
+echo "Submitted batch job $job_id"
+if [ -n "$FAKE_SLURM_EXECUTE" ]; then
+  for i in $(seq ${array%%-*} ${last:-0}); do
+    (IFS=','; for kv in $exports; do case "$kv" in *=*) export "$kv";; esac; done
+     SLURM_ARRAY_JOB_ID=$job_id SLURM_ARRAY_TASK_ID=$i bash "$script") \
+      >> "$FAKE_SLURM_STATE/output_$job_id" 2>&1
+  done
+fi
+"""
+
+SACCT = r"""#!/usr/bin/env bash
+jobs=""
+while [ $# -gt 0 ]; do case "$1" in -j) jobs="$2"; shift 2;; *) shift;; esac; done
+for job_id in ${jobs//,/ }; do
+  [ -f "$FAKE_SLURM_STATE/job_$job_id" ] || continue
+  echo "${job_id}_[$(cat "$FAKE_SLURM_STATE/job_$job_id")]|COMPLETED|00:00:01|0:0"
+done
+"""
+
+SQUEUE = """#!/usr/bin/env bash
+true
+"""
+
+SCONTROL = """#!/usr/bin/env bash
+echo "MaxArraySize            = $FAKE_SLURM_MAX_ARRAY_SIZE"
+"""
+
+
+class FakeCluster(object):
+    """Fake Slurm commands, state and SSH statistics shared by connections."""
+
+    def __init__(
+        self,
+        latency=0.0,
+        drop_rate=0.0,
+        lost_response_rate=0.0,
+        max_array_size=1001,
+        execute=False,
+        seed=0,
+    ):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.lost_response_rate = lost_response_rate
+        self.root = tempfile.mkdtemp(prefix="fake_slurm_")
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.state_dir = os.path.join(self.root, "state")
+        os.makedirs(self.bin_dir)
+        os.makedirs(self.state_dir)
+        for name, program in [
+            ("sbatch", SBATCH),
+            ("srun", SBATCH),
+            ("sacct", SACCT),
+            ("squeue", SQUEUE),
+            ("scontrol", SCONTROL),
+        ]:
+            path = os.path.join(self.bin_dir, name)
+            with open(path, "w") as f:
+                f.write(program)
+            os.chmod(path, 0o755)
+        self.env = dict(
+            os.environ,
+            PATH=self.bin_dir + os.pathsep + os.environ["PATH"],
+            FAKE_SLURM_STATE=self.state_dir,
+            FAKE_SLURM_MAX_ARRAY_SIZE=str(max_array_size),
+        )
+        if execute:
+            self.env["FAKE_SLURM_EXECUTE"] = "1"
+        self.round_trips = 0
+        self.drops = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def round_trip(self):
+        """Accounts one request/response exchange; may drop the connection."""
+        with self._lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+        self._maybe_drop(self.drop_rate)
+
+    def response(self):
+        """Called when a request was executed; may lose the response."""
+        self._maybe_drop(self.lost_response_rate)
+
+    def _maybe_drop(self, rate):
+        with self._lock:
+            dropped = self._random.random() < rate
+            if dropped:
+                self.drops += 1
+        if dropped:
+            raise SSHException("Fake connection dropped")
+
+    @property
+    def submitted_jobs(self):
+        return len([n for n in os.listdir(self.state_dir) if n.startswith("job_")])
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class FakeConnection(object):
+    """Subset of fabric.Connection used by the Slurm backend."""
+
+    cluster = None
+
+    def __init__(self, host, **kwargs):
+        self.host = host
+        self.client = _FakeClient(self.cluster)
+
+    def open(self):
+        pass
+
+    def run(self, cmd, warn=False, hide=None):
+        self.cluster.round_trip()
+        process = subprocess.run(
+            ["bash", "-c", cmd], capture_output=True, text=True, env=self.cluster.env
+        )
+        result = Result(
+            stdout=process.stdout,
+            stderr=process.stderr,
+            command=cmd,
+            exited=process.returncode,
+        )
+        self.cluster.response()
+        if not warn and not result.ok:
+            raise UnexpectedExit(result)
+        return result
+
+    def put(self, local, remote):
+        self.cluster.round_trip()
+        shutil.copyfile(str(local), str(remote))
+        self.cluster.response()
+
+    def sftp(self):
+        return _FakeSftp(self.cluster)
+
+
+class _FakeSftp(object):
+    def __init__(self, cluster):
+        self._cluster = cluster
+
+    def open(self, path, mode):
+        self._cluster.round_trip()
+        return _FakeRemoteFile(path, mode)
+
+
+class _FakeRemoteFile(object):
+    def __init__(self, path, mode):
+        self._file = open(path, mode)
+
+    def set_pipelined(self, pipelined):
+        pass
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+class _FakeClient(object):
+    def __init__(self, cluster):
+        self._cluster = cluster
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return _FakeChannel(self._cluster)
+
+
+class _FakeChannel(object):
+    def __init__(self, cluster):
+        self._cluster = cluster
+
+    def set_combine_stderr(self, combine):
+        pass
+
+    def exec_command(self, cmd):
+        self._cluster.round_trip()
+        self._process = subprocess.Popen(
+            ["bash", "-c", cmd],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self._cluster.env,
+        )
+
+    def recv(self, size):
+        return os.read(self._process.stdout.fileno(), size)
+
+    def sendall(self, data):
+        self._process.stdin.write(data)
+
+    def shutdown_write(self):
+        self._process.stdin.close()
+
+    def recv_exit_status(self):
+        status = self._process.wait()
+        self._cluster.response()
+        return status
+
+    def close(self):
+        self._process.stdout.close()
+
+
+@contextlib.contextmanager
+def installed(**cluster_kwargs):
+    """Routes Slurm backend connections to a new FakeCluster while active."""
+    cluster = FakeCluster(**cluster_kwargs)
+    original_connection = slurm_backend.Connection
+    FakeConnection.cluster = cluster
+    slurm_backend.Connection = FakeConnection
+    slurm_backend.SlurmBackend.conn_cache.clear()
+    slurm_backend.SlurmBackend.max_array_sizes.clear()
+    # the shared backend remembers directories created on the previous cluster
+    slurm_backend._slurm_backend = None
+    try:
+        yield cluster
+    finally:
+        slurm_backend.Connection = original_connection
+        slurm_backend.SlurmBackend.conn_cache.clear()
+        slurm_backend.SlurmBackend.max_array_sizes.clear()
+        cluster.cleanup()
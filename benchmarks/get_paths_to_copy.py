@@ -0,0 +1,98 @@
+"""Benchmark of mrunner.utils.utils.get_paths_to_copy on a synthetic tree.
+
+Builds a tree with --files files spread over nested directories, excludes
+--excludes of them (like an expanded .mrunnerignore does) and compares the
+current implementation with the previous Path.listdir based one.
+
+    python benchmarks/get_paths_to_copy.py --files 100000 --excludes 2000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from path import Path
+
+from mrunner.utils.utils import PathToDump, get_paths_to_copy
+
+
+def legacy_get_paths_to_copy(exclude):
+    exclude = [Path(e).abspath() for e in exclude]
+
+    def _list_dir(d):
+        directories = []
+        for p in Path(d).listdir():
+            p = p.abspath()
+            excluded = False
+            for e in exclude:
+                e = Path(e).abspath()
+                if not e.relpath(p).startswith(".."):
+                    excluded = True
+                    if e != p:
+                        directories += _list_dir(p)
+                    break
+            if not excluded:
+                directories.append(PathToDump(p.relpath("."), p.relpath(".")))
+        return directories
+
+    return set(_list_dir(Path(".")))
+
+
+def make_tree(root, n_files, fanout=10, files_per_dir=50):
+    paths = []
+    dirs = [""]
+    while len(paths) < n_files:
+        d = dirs[len(paths) // files_per_dir % len(dirs)]
+        for i in range(files_per_dir):
+            paths.append(os.path.join(d, f"file_{len(paths)}.py"))
+        if len(dirs) * files_per_dir < n_files:
+            parent = random.choice(dirs)
+            dirs.extend(
+                os.path.join(parent, f"dir_{len(dirs)}_{j}") for j in range(fanout)
+            )
+    for d in dirs:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    for p in paths[:n_files]:
+        open(os.path.join(root, p), "w").close()
+    return paths[:n_files]
+
+
+def _timeit(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--excludes", type=int, default=2000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as root:
+        files = make_tree(root, args.files)
+        exclude = random.sample(files, min(args.excludes, len(files)))
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            elapsed, result = _timeit(lambda: get_paths_to_copy(exclude=exclude))
+            print(f"get_paths_to_copy: {elapsed:.3f}s, {len(result)} entries")
+            if not args.skip_legacy:
+                legacy_elapsed, legacy_result = _timeit(
+                    lambda: legacy_get_paths_to_copy(exclude)
+                )
+                print(
+                    f"legacy:            {legacy_elapsed:.3f}s, {len(legacy_result)} entries"
+                    f" ({legacy_elapsed / elapsed:.1f}x slower)"
+                )
+                assert set(result) == legacy_result, "results differ"
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Benchmark of `mrunner run` submission latency on the fake Slurm cluster.
+
+Times SlurmBackend.run and the whole command for every combination of grid
+size and code tree size, on a cold remote (nothing cached) and warm (same
+sweep submitted again). Every SSH round trip costs --latency seconds and is
+dropped with probability --drop-rate, or loses its response after the
+command was executed with probability --lost-response-rate; the CLI
+answers both with retries. The jobs column counts arrays submitted to the
+fake cluster, duplicates would show up there.
+
+    python benchmarks/submission_latency.py --experiments 10,1000,10000 \\
+        --files 1000,10000,100000 --latency 0.05 --drop-rate 0.01 \\
+        --option deploy_mode=single
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import tempfile
+import time
+
+import fake_slurm
+import yaml
+from get_paths_to_copy import make_tree
+
+import mrunner.experiment
+from mrunner.backends.slurm import SlurmBackend
+from mrunner.cli.mrunner_cli import cli
+
+SPEC = """
+from mrunner.helpers.specification_helper import create_experiments_helper
+
+experiments_list = create_experiments_helper(
+    experiment_name="bench",
+    project_name="bench/project",
+    script="python exp.py",
+    python_path=".",
+    tags=[],
+    base_config={{}},
+    params_grid={{"index": list(range({experiments}))}},
+    with_neptune=False,
+)
+"""
+
+EXPERIMENT = """
+from mrunner.helpers.client_helper import get_configuration
+
+print(get_configuration().index)
+"""
+
+
+@contextlib.contextmanager
+def timed_backend_runs(durations):
+    original_run = SlurmBackend.run
+
+    def run(self, experiments):
+        start = time.perf_counter()
+        try:
+            return original_run(self, experiments)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    SlurmBackend.run = run
+    try:
+        yield
+    finally:
+        SlurmBackend.run = original_run
+
+
+def submit(config_path, cluster):
+    """Runs `mrunner run`, returns (total, backend run time, round trips).
+
+    The times are None if the submission failed despite the CLI retries.
+    """
+    durations = []
+    round_trips = cluster.round_trips
+    # the spec module is cached between invocations of the CLI
+    mrunner.experiment._experiment_list = None
+    start = time.perf_counter()
+    with timed_backend_runs(durations):
+        try:
+            cli(["--config", config_path, "run", "spec.py"], standalone_mode=False)
+        except RuntimeError:
+            return None, None, cluster.round_trips - round_trips
+    return (
+        time.perf_counter() - start,
+        sum(durations),
+        cluster.round_trips - round_trips,
+    )
+
+
+def _format_time(seconds):
+    return "failed" if seconds is None else f"{seconds:.2f}"
+
+
+def bench_case(args, experiments, files, options):
+    with tempfile.TemporaryDirectory() as root:
+        project_dir = os.path.join(root, "project")
+        os.makedirs(project_dir)
+        make_tree(project_dir, files)
+        with open(os.path.join(project_dir, "spec.py"), "w") as f:
+            f.write(SPEC.format(experiments=experiments))
+        with open(os.path.join(project_dir, "exp.py"), "w") as f:
+            f.write(EXPERIMENT)
+        context = dict(
+            backend_type="slurm",
+            slurm_url="bench@fake-cluster",
+            storage_dir=os.path.join(root, "remote"),
+            cmd_type="sbatch",
+            # sweeps larger than the fake MaxArraySize are rejected otherwise
+            max_array_size="auto",
+        )
+        context.update(options)
+        config_path = os.path.join(root, "config.yaml")
+        with open(config_path, "w") as f:
+            yaml.safe_dump(
+                {"contexts": {"bench": context}, "current_context": "bench"}, f
+            )
+
+        cwd = os.getcwd()
+        os.chdir(project_dir)
+        os.environ["MRUNNER_CACHE_DIR"] = os.path.join(root, "local_cache")
+        try:
+            with fake_slurm.installed(
+                latency=args.latency,
+                drop_rate=args.drop_rate,
+                lost_response_rate=args.lost_response_rate,
+                max_array_size=args.max_array_size,
+            ) as cluster:
+                cold = submit(config_path, cluster)
+                warm = submit(config_path, cluster)
+                drops = cluster.drops
+                jobs = cluster.submitted_jobs
+        finally:
+            os.chdir(cwd)
+    print(
+        f"{experiments:>11} {files:>8} "
+        f"{_format_time(cold[0]):>9} {_format_time(cold[1]):>9} {cold[2]:>5} "
+        f"{_format_time(warm[0]):>9} {_format_time(warm[1]):>9} {warm[2]:>5}"
+        f" {drops:>6} {jobs:>5}",
+        flush=True,
+    )
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def _option(value):
+    key, _, raw_value = value.partition("=")
+    return key, yaml.safe_load(raw_value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--experiments", type=_int_list, default=[10, 1000, 10000])
+    parser.add_argument("--files", type=_int_list, default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--lost-response-rate", type=float, default=0.0)
+    parser.add_argument("--max-array-size", type=int, default=1001)
+    parser.add_argument(
+        "--option",
+        type=_option,
+        action="append",
+        default=[],
+        help="Slurm context option, e.g. deploy_mode=single",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show mrunner logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        # retried failures are logged with tracebacks
+        logging.disable(logging.CRITICAL)
+
+    print(
+        f"latency {args.latency}s, drop rate {args.drop_rate}, "
+        f"options {dict(args.option)}"
+    )
+    print(
+        f"{'experiments':>11} {'files':>8} "
+        f"{'cold [s]':>9} {'run [s]':>9} {'RTs':>5} "
+        f"{'warm [s]':>9} {'run [s]':>9} {'RTs':>5} {'drops':>6} {'jobs':>5}"
+    )
+    for experiments in args.experiments:
+        for files in args.files:
+            bench_case(args, experiments, files, dict(args.option))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 # pylint: disable=import-outside-toplevel,missing-function-docstring
 
 
-def get_backend(backend_type):
+def get_backend(backend_type, shared=True):
+    """Returns the backend; shared=False gives a new instance (e.g. per thread)."""
     if backend_type == "kubernetes":
-        from mrunner.backends.k8s import get_kubernetes_backend
+        from mrunner.backends.k8s import KubernetesBackend, get_kubernetes_backend
 
-        return get_kubernetes_backend()
+        return get_kubernetes_backend() if shared else KubernetesBackend()
     if backend_type == "slurm":
-        from mrunner.backends.slurm import get_slurm_backend
+        from mrunner.backends.slurm import SlurmBackend, get_slurm_backend
 
-        return get_slurm_backend()
+        return get_slurm_backend() if shared else SlurmBackend()
+    if backend_type == "local":
+        from mrunner.backends.local import LocalBackend, get_local_backend
+
+        return get_local_backend() if shared else LocalBackend()
 
     raise KeyError(f"No backend type: {backend_type}")
 
@@ -23,5 +28,9 @@ def get_context_cls(backend_type):
         from mrunner.backends.slurm import SlurmContext
 
         return SlurmContext
+    if backend_type == "local":
+        from mrunner.backends.local import LocalContext
+
+        return LocalContext
 
     raise KeyError(f"No backend type: {backend_type}")
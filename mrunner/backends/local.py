@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import queue
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import attr
+from attrs import define
+from path import Path
+
+from mrunner.experiment import ContextBase, Experiment
+from mrunner.utils.config_bundle import CONFIG_BUNDLE_NAME
+from mrunner.utils.mrunnerignore import MrunnerIgnore
+from mrunner.utils.snapshot import take_snapshot
+from mrunner.utils.utils import filter_only_attr, get_paths_to_copy, pathify
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_LOGS_DIR_NAME = "logs"
+DEFAULT_CONFIGS_DIR_NAME = "configs"
+
+
+@define(kw_only=True)
+class LocalContext(ContextBase):
+    # number of tasks running at once, defaults to the number of usable CPUs
+    workers: Optional[int] = None
+    # every running task is pinned to its own set of this many CPUs
+    cpus_per_task: Optional[int] = None
+    config_bundle: bool = False
+
+
+@define
+class _LocalExperiment(LocalContext, Experiment):
+    @property
+    def grid_dir(self):
+        return (
+            Path(self.storage_dir)
+            / pathify(self.project.split("/")[-1])
+            / pathify(self.unique_name)
+        )
+
+    @property
+    def experiment_dir(self):
+        return self.grid_dir / pathify(self.name)
+
+    @property
+    def grid_logs_dir(self):
+        return self.grid_dir / DEFAULT_LOGS_DIR_NAME
+
+    @property
+    def grid_configs_dir(self):
+        return self.grid_dir / DEFAULT_CONFIGS_DIR_NAME
+
+
+@attr.s
+class LocalBackend(object):
+    """Runs a sweep on this machine, in the directory layout of the Slurm backend.
+
+    The code snapshot is copied once; every task gets a directory of links
+    to it with its config, and runs the same command as a Slurm array task,
+    with MRUNNER_TASK_ID set to its index. run returns when all tasks end.
+    """
+
+    def run(self, experiments):
+        experiment = _LocalExperiment(
+            **filter_only_attr(_LocalExperiment, experiments[0]),
+        )
+        LOGGER.debug("Configuration: {}".format(experiment))
+
+        experiment.experiment_dir.makedirs_p()
+        experiment.grid_logs_dir.makedirs_p()
+        if experiment.send_code:
+            self.copy_code(experiment)
+        shutil.copytree(
+            experiment.cmd._experiment_config_path.dirname(),
+            experiment.grid_configs_dir,
+        )
+
+        cpu_sets = self._cpu_sets(experiment)
+        workers = experiment.workers or len(cpu_sets) or os.cpu_count() or 1
+        if cpu_sets:
+            workers = min(workers, len(cpu_sets))
+        free_cpu_sets = queue.Queue()
+        for cpu_set in cpu_sets[:workers]:
+            free_cpu_sets.put(cpu_set)
+
+        def _run_task(index):
+            cpu_set = free_cpu_sets.get() if cpu_sets else None
+            try:
+                return self.run_task(experiment, index, cpu_set)
+            finally:
+                if cpu_set is not None:
+                    free_cpu_sets.put(cpu_set)
+
+        LOGGER.info("Running %d tasks, %d at once", len(experiments), workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return_codes = list(executor.map(_run_task, range(len(experiments))))
+
+        failed = [i for i, code in enumerate(return_codes) if code != 0]
+        if failed:
+            LOGGER.error(
+                "%d of %d tasks failed (%s), see logs in %s",
+                len(failed),
+                len(experiments),
+                ", ".join(map(str, failed)),
+                experiment.grid_logs_dir,
+            )
+        return (experiment, experiments)
+
+    def copy_code(self, experiment):
+        ignore = (
+            MrunnerIgnore(experiment.mrunner_ignore)
+            if experiment.mrunner_ignore
+            else None
+        )
+        paths_to_dump = get_paths_to_copy(
+            exclude=experiment.exclude,
+            paths_to_copy=experiment.paths_to_copy,
+            ignore=ignore,
+        )
+        for entry in take_snapshot(paths_to_dump, ignore=ignore, with_digests=False):
+            target = experiment.experiment_dir / entry.rel_remote_path
+            target.dirname().makedirs_p()
+            if entry.link_target is not None:
+                os.symlink(entry.link_target, target)
+            else:
+                shutil.copy2(entry.local_path, target)
+
+    def run_task(self, experiment, index, cpu_set=None):
+        task_dir = Path(f"{experiment.experiment_dir}_{index}")
+        # the snapshot is shared by all tasks, as task_workdir: symlink on Slurm;
+        # link targets have to be absolute, they are resolved in task_dir
+        shutil.copytree(
+            experiment.experiment_dir.abspath(),
+            task_dir,
+            symlinks=True,
+            copy_function=os.symlink,
+        )
+        config_name = (
+            CONFIG_BUNDLE_NAME if experiment.config_bundle else f"config_{index}"
+        )
+        shutil.copy(experiment.grid_configs_dir / config_name, task_dir)
+
+        # expanded as by export in the Slurm script, e.g. "$PYTHONPATH:."
+        env = dict(os.environ)
+        env.update((k, os.path.expandvars(v)) for k, v in experiment.env.items())
+        env["MRUNNER_TASK_ID"] = str(index)
+        preexec_fn = None
+        if cpu_set is not None:
+            preexec_fn = lambda: os.sched_setaffinity(0, cpu_set)
+
+        log_path = experiment.grid_logs_dir / f"task_{index}.log"
+        LOGGER.debug("Running task %d in %s", index, task_dir)
+        with open(log_path, "wb") as log_file:
+            return subprocess.call(
+                experiment.cmd.command,
+                shell=True,
+                cwd=task_dir,
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                preexec_fn=preexec_fn,
+            )
+
+    @staticmethod
+    def _cpu_sets(experiment):
+        """Disjoint CPU sets, one per concurrently running task."""
+        if not experiment.cpus_per_task:
+            return []
+        if not hasattr(os, "sched_getaffinity"):
+            LOGGER.warning("CPU affinity is not supported on this platform")
+            return []
+        cpus = sorted(os.sched_getaffinity(0))
+        size = experiment.cpus_per_task
+        if size > len(cpus):
+            LOGGER.warning("Only %d CPUs available, not pinning tasks", len(cpus))
+            return []
+        return [set(cpus[i : i + size]) for i in range(0, len(cpus) - size + 1, size)]
+
+
+_local_backend = None
+
+
+def get_local_backend():
+    global _local_backend
+    if _local_backend is None:
+        _local_backend = LocalBackend()
+    return _local_backend
@@ -1,20 +1,43 @@
 # -*- coding: utf-8 -*-
+import collections
+import contextlib
+import hashlib
+import heapq
+import io
 import logging
+import math
+import re
+import shlex
+import sys
 import tarfile
-import tempfile
+import threading
+import types
+from typing import Optional, Union
 
 import attr
-from attrs import Factory, define, field
+from attrs import Factory, define, field, validators
 from fabric import Connection
 from path import Path
-from typing import Optional
 
 from mrunner.experiment import ContextBase, Experiment
+from mrunner.utils import tracing
+from mrunner.utils.compression import (
+    ARCHIVE_SUFFIXES,
+    COMPRESSIONS,
+    DEFAULT_GZIP_LEVEL,
+    open_compressed_writer,
+)
+from mrunner.utils.mrunnerignore import MrunnerIgnore
 from mrunner.utils.namesgenerator import id_generator
+from mrunner.utils.snapshot import DigestCache, snapshot_digest, take_snapshot
+from mrunner.utils.ssh_master import ControlMasterConnection
+from mrunner.utils.stages import StageLog
+from mrunner.utils.sweep_registry import register_sweep
 from mrunner.utils.utils import (
     GeneratedTemplateFile,
     filter_only_attr,
     get_paths_to_copy,
+    parse_size,
     pathify,
 )
 
@@ -24,7 +47,48 @@ DEFAULT_SCRATCH_DIR = "mrunner_scratch"
 DEFAULT_CACHE_DIR = ".cache"
 DEFAULT_LOGS_DIR_NAME = "logs"
 DEFAULT_CONFIGS_DIR_NAME = "configs"
-TMP_CONFIGS_DIR = "___configs___"  # temporary directory name to send configs using the same zip as code, it should be very unique
+DEFAULT_DELTA_DIR_NAME = "delta"
+DEFAULT_ASSETS_DIR_NAME = ".assets"
+CODE_SYNC_MODES = ("archive", "delta")
+TASK_WORKDIR_MODES = ("copy", "symlink", "hardlink")
+DEPLOY_MODES = ("steps", "single")
+CONFIGS_ARCHIVE_NAME = "configs"
+# remote markers of completed submission stages, in the grid dir
+STAGE_MARKERS_DIR_NAME = ".stages"
+DELTA_TREE_NAME = "code.tree"
+# prefix of key=value lines the single exec deployment script reports with
+RESULT_LINE_PREFIX = "MRUNNER_RESULT "
+JOB_ID_RE = re.compile(r"Submitted batch job (\d+)")
+MAX_ARRAY_SIZE_RE = re.compile(r"^MaxArraySize\s*=\s*(\d+)", re.MULTILINE)
+# states in which array tasks stay, their status is not queried again
+FINAL_JOB_STATES = {
+    "BOOT_FAIL",
+    "CANCELLED",
+    "COMPLETED",
+    "DEADLINE",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "TIMEOUT",
+}
+# final states of tasks that `mrunner resubmit --failed` submits again
+FAILED_JOB_STATES = FINAL_JOB_STATES - {"COMPLETED"}
+
+# Rebuilds the experiment tree from the delta store blobs; argv: tree manifest, blobs dir.
+DELTA_ASSEMBLE_PROGRAM = """
+import os, shutil, sys
+blobs_dir = sys.argv[2]
+for line in open(sys.argv[1]):
+    kind, ref, mode, path = line.rstrip("\\n").split("\\t", 3)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if kind == "l":
+        os.symlink(ref, path)
+    else:
+        shutil.copyfile(os.path.join(blobs_dir, ref), path)
+        os.chmod(path, int(mode, 8))
+"""
 
 
 @define(kw_only=True)
@@ -54,11 +118,71 @@ class SlurmContext(ContextBase):
     cache_dir_name: Path = DEFAULT_CACHE_DIR
     grid_logs_dir_name: str = DEFAULT_LOGS_DIR_NAME
     grid_configs_dir_name: str = DEFAULT_CONFIGS_DIR_NAME
+    # "delta" uploads only changed files (requires python3 on the login node)
+    code_sync: str = field(default="archive", validator=validators.in_(CODE_SYNC_MODES))
+    # bounds of the remote archive cache, least recently used archives go first
+    cache_max_size: Optional[str] = None
+    cache_max_age_days: Optional[int] = None
+    compression: str = field(default="gzip", validator=validators.in_(COMPRESSIONS))
+    # None adapts the level to the measured upload throughput
+    compression_level: Optional[int] = None
+    compression_threads: Optional[int] = None
+    # "symlink"/"hardlink" link array task dirs to a shared read-only code tree
+    task_workdir: str = field(
+        default="copy", validator=validators.in_(TASK_WORKDIR_MODES)
+    )
+    # max random delay (in seconds) of array task start-up
+    task_start_jitter: Optional[int] = None
+    # files of at least this size (e.g. "100M") go to the shared asset store
+    asset_size_threshold: Optional[str] = None
+    # all configs in one indexed file instead of a file per array task
+    config_bundle: bool = False
+    # "single" deploys and submits in one SSH exec, with the payload on its stdin
+    deploy_mode: str = field(default="steps", validator=validators.in_(DEPLOY_MODES))
+    # reuse one authenticated SSH connection across mrunner invocations
+    ssh_control_master: bool = False
+    # idle time after which the control master exits (ssh ControlPersist)
+    ssh_control_persist: str = "30m"
+    ssh_keepalive_interval: int = 30
+    # larger sweeps are split into several arrays; "auto" asks scontrol
+    max_array_size: Union[int, str, None] = None
+    # experiments run concurrently in one array task, each on cpu cores of its own
+    experiments_per_task: int = field(default=1, validator=validators.ge(1))
+
+
+@define
+class SubmissionResult:
+    job_id: Optional[str] = None
+    grid_dir: Optional[str] = None
+    experiment_dir: Optional[str] = None
+    script_path: Optional[str] = None
+    # array offset -> job id, for sweeps split into several arrays
+    jobs: dict[int, str] = Factory(dict)
+
+    @classmethod
+    def from_output(cls, output):
+        """Parses the output of a submission (result lines and sbatch message)."""
+        values = {"jobs": {}}
+        for line in output.splitlines():
+            if line.startswith(RESULT_LINE_PREFIX):
+                key, _, value = line[len(RESULT_LINE_PREFIX) :].partition("=")
+                if key.startswith("job_"):
+                    values["jobs"][int(key[len("job_") :])] = value
+                elif key in attr.fields_dict(cls):
+                    values[key] = value
+        if values["jobs"]:
+            values.setdefault("job_id", values["jobs"][min(values["jobs"])])
+        else:
+            match = JOB_ID_RE.search(output)
+            if match and "job_id" not in values:
+                values["job_id"] = match.group(1)
+        return cls(**values)
 
 
 @define
 class _SlurmExperiment(SlurmContext, Experiment):
     _experiment_scratch_dir: Path = field(init=False, default=None)
+    submission: Optional[SubmissionResult] = field(init=False, default=None)
 
     @property
     def scratch_dir(self):
@@ -72,6 +196,22 @@ class _SlurmExperiment(SlurmContext, Experiment):
     def project_scratch_dir(self):
         return self.scratch_dir / pathify(self.project.split("/")[-1])
 
+    @property
+    def assets_dir(self):
+        return self.scratch_dir / DEFAULT_ASSETS_DIR_NAME
+
+    @property
+    def archive_suffix(self):
+        return ARCHIVE_SUFFIXES[self.compression]
+
+    @property
+    def delta_store_dir(self):
+        return (
+            self.cache_dir
+            / DEFAULT_DELTA_DIR_NAME
+            / pathify(self.project.split("/")[-1])
+        )
+
     @property
     def grid_scratch_dir(self):
         return self.project_scratch_dir / pathify(self.unique_name)
@@ -93,14 +233,19 @@ class _SlurmExperiment(SlurmContext, Experiment):
     def grid_configs_dir(self):
         return self.grid_scratch_dir / self.grid_configs_dir_name
 
+    @property
+    def stage_markers_dir(self):
+        return self.grid_scratch_dir / STAGE_MARKERS_DIR_NAME
+
 
 class ExperimentScript(GeneratedTemplateFile):
     DEFAULT_SLURM_EXPERIMENT_SCRIPT_TEMPLATE = "slurm_experiment.sh.jinja2"
 
-    def __init__(self, experiment: _SlurmExperiment):
+    def __init__(self, experiment: _SlurmExperiment, sweep_size=None):
         super(ExperimentScript, self).__init__(
             template_filename=self.DEFAULT_SLURM_EXPERIMENT_SCRIPT_TEMPLATE,
             experiment=experiment,
+            sweep_size=sweep_size,
         )
         self.experiment = experiment
         self.path.chmod("a+x")
@@ -113,11 +258,27 @@ class ExperimentScript(GeneratedTemplateFile):
 
 class SlurmWrappersCmd(object):
 
-    def __init__(self, experiment, script_path, array_size, cmd_type):
+    def __init__(
+        self,
+        experiment,
+        script_path,
+        array_size,
+        cmd_type,
+        array_offset=0,
+        array_indices=None,
+    ):
         self._experiment = experiment
         self._script_path = script_path
-        self.array_str = rf"0-{array_size-1}"
         self._cmd = cmd_type
+        self.array_offset = array_offset
+        # a sparse array of given indices, e.g. tasks submitted again
+        self.array_indices = array_indices
+        if array_indices is not None:
+            self.array_size = len(array_indices)
+            self.array_str = format_array_indices(array_indices)
+        else:
+            self.array_size = array_size
+            self.array_str = rf"0-{array_size-1}"
 
     @property
     def command(self):
@@ -132,10 +293,12 @@ class SlurmWrappersCmd(object):
             elif default:
                 cmd_items += [option, default]
 
+        # %a is the index within this array, the experiment index is offset + %a
+        log_name = f"slurm_{self.array_offset}+%a" if self.array_offset else "slurm_%a"
+        # keep the log of the previous attempt of a resubmitted task
+        log_name += ".%A.log" if self.array_indices is not None else ".log"
         default_log_path = (
-            self._experiment.grid_logs_dir / "slurm_%a.log"
-            if self._cmd == "sbatch"
-            else None
+            self._experiment.grid_logs_dir / log_name if self._cmd == "sbatch" else None
         )
         _extend_cmd_items(cmd_items, "-A", "account")
         _extend_cmd_items(
@@ -147,6 +310,8 @@ class SlurmWrappersCmd(object):
         _extend_cmd_items(cmd_items, "--nodelist", "nodelist")
         _extend_cmd_items(cmd_items, "--exclude", "exclude_nodes")
         _extend_cmd_items(cmd_items, "--array", "array_str")
+        if self.array_offset:
+            cmd_items += [f"--export=ALL,MRUNNER_ARRAY_OFFSET={self.array_offset}"]
 
         cmd_items += self._resources_items()
         cmd_items += [self._script_path]
@@ -159,6 +324,8 @@ class SlurmWrappersCmd(object):
     def _resources_items(self):
         """mapping from mrunner notation into slurm"""
         cmd_items = []
+        # a pack of experiments gets cpu and mem of each of them, gpus are shared
+        pack = int(self._getattr("experiments_per_task") or 1)
         # mrunner_resources = self._getattr('resources')
         # TODO(pm): Refactor me please
         mrunner_resources = {}
@@ -168,18 +335,18 @@ class SlurmWrappersCmd(object):
         for resource_type, resource_qty in mrunner_resources.items():
             if resource_type == "cpu":
                 ntasks = int(self._getattr("ntasks") or 1)
-                cores_per_task = int(int(resource_qty) / ntasks)
+                cores_per_task = int(int(resource_qty) / ntasks) * pack
                 cmd_items += ["-c", str(cores_per_task)]
 
                 if ntasks > 1:
                     cmd_items += ["-n", str(ntasks)]
                     LOGGER.debug("Running %d tasks", ntasks)
                 total_cpus = cores_per_task * ntasks
-                if total_cpus != int(resource_qty):
+                if total_cpus != int(resource_qty) * pack:
                     LOGGER.warning(
                         "Will request %d CPU instead of %d",
                         total_cpus,
-                        int(resource_qty),
+                        int(resource_qty) * pack,
                     )
                 LOGGER.debug(
                     "Using %d/%d CPU cores per_task/total", cores_per_task, total_cpus
@@ -188,7 +355,7 @@ class SlurmWrappersCmd(object):
                 cmd_items += ["--gres", f"gpu:{int(resource_qty)}"]
                 LOGGER.debug("Using %d gpu", int(resource_qty))
             elif resource_type == "mem":
-                cmd_items += ["--mem", str(resource_qty)]
+                cmd_items += ["--mem", _scale_mem(resource_qty, pack)]
                 LOGGER.debug("Using %s memory", resource_qty)
             elif resource_type == "nodes":
                 cmd_items += ["--nodes", str(resource_qty)]
@@ -205,6 +372,10 @@ class SlurmBackend(object):
 
     initialized = attr.ib(default=False, init=False)
     conn_cache = {}
+    # backends of concurrent submissions share conn_cache
+    conn_cache_lock = threading.Lock()
+    # MaxArraySize queried from scontrol, by slurm_url
+    max_array_sizes = {}
 
     def run(self, experiments):
 
@@ -212,110 +383,983 @@ class SlurmBackend(object):
             0
         ]  # Assume that all experiments share deployment config. This should be reflected in all code.
         # configure fabric
-        slurm_url = experiment["slurm_url"]
-        if slurm_url in self.conn_cache:
-            self.connection = self.conn_cache[slurm_url]
-            LOGGER.debug("REUSING cached connection")
-        else:
-            LOGGER.debug("NEW connection connection")
-            self.connection = Connection(slurm_url)
-            self.conn_cache[slurm_url] = self.connection
+        with tracing.span("slurm.connect"):
+            self._connect(experiment)
 
         # create Slurm experiment
         experiment = _SlurmExperiment(
             **filter_only_attr(_SlurmExperiment, experiment),
         )
+        # a retry of this submission resumes from the first stage not completed;
+        # remote markers make extraction and sbatch safe to repeat
+        # contexts of a sweep share unique_name, a log is kept per context
+        submission_key = "\n".join(
+            [
+                experiment.slurm_url,
+                str(experiment.storage_dir),
+                experiment.context_name,
+                experiment.unique_name,
+            ]
+        )
+        submission_digest = hashlib.sha1(submission_key.encode()).hexdigest()[:8]
+        stages = StageLog(f"{pathify(experiment.unique_name)}-{submission_digest}")
+        if stages.resumed:
+            LOGGER.info("Resuming submission of %s", experiment.unique_name)
+        experiment._experiment_scratch_dir = Path(
+            stages.value("experiment_dir", lambda: experiment.experiment_scratch_dir)
+        )
 
         # create experiment script
-        script = ExperimentScript(experiment)
+        script = ExperimentScript(experiment, sweep_size=len(experiments))
         remote_script_path = experiment.project_scratch_dir / script.script_name
-        archive_remote_path = experiment.cache_dir / experiment.unique_name
+        configs_remote_path = experiment.grid_scratch_dir / (
+            CONFIGS_ARCHIVE_NAME + experiment.archive_suffix
+        )
 
         LOGGER.debug("Configuration: {}".format(experiment))
 
-        self.ensure_directories(experiment)
-        self.cache_code(experiment, archive_remote_path)
-        self.deploy_code(experiment, archive_remote_path)
-        self.send_script(script, remote_script_path)
+        cmds = _array_cmds(
+            experiment,
+            remote_script_path,
+            len(experiments),
+            self._get_max_array_size(experiment),
+        )
+        if experiment.deploy_mode == "single":
+            with tracing.span("deploy_and_submit"):
+                experiment.submission = self.deploy_and_submit(experiment, script, cmds)
+            self._register(experiment, cmds)
+            stages.remove()
+            return (experiment, experiments)
 
-        cmd = SlurmWrappersCmd(
-            experiment=experiment,
-            script_path=remote_script_path,
-            array_size=len(experiments),
-            cmd_type=experiment.cmd_type,
+        stages.run("directories", lambda: self.ensure_directories(experiment))
+        archive_remote_path = stages.run("code", lambda: self.cache_code(experiment))
+        stages.run(
+            "configs", lambda: self.send_configs(experiment, configs_remote_path)
+        )
+        stages.run(
+            "deploy",
+            lambda: self.deploy_code(
+                experiment, archive_remote_path, configs_remote_path
+            ),
         )
-        self._fabric_run(cmd.command, warn=False)
+        stages.run("script", lambda: self.send_script(script, remote_script_path))
+
+        with tracing.span("submit", arrays=len(cmds)):
+            output = self._fabric_run(
+                _submit_cmd(cmds, experiment.stage_markers_dir), warn=False
+            ).stdout
+        experiment.submission = attr.evolve(
+            SubmissionResult.from_output(output),
+            grid_dir=str(experiment.grid_scratch_dir),
+            experiment_dir=str(experiment.experiment_scratch_dir),
+            script_path=str(remote_script_path),
+        )
+        self._register(experiment, cmds)
+        stages.remove()
         return (experiment, experiments)
 
-    def ensure_directories(self, experiment):
-        self._ensure_dir(experiment.experiment_scratch_dir)
-        self._ensure_dir(experiment.grid_logs_dir)
-        if not self.initialized:
-            self._ensure_dir(experiment.cache_dir)
-            self.initialized = True
+    def _connect(self, context):
+        slurm_url = context["slurm_url"]
+        with self.conn_cache_lock:
+            if slurm_url in self.conn_cache:
+                self.connection = self.conn_cache[slurm_url]
+                LOGGER.debug("REUSING cached connection")
+            elif context.get("ssh_control_master"):
+                LOGGER.debug("NEW control master connection")
+                self.connection = ControlMasterConnection(
+                    slurm_url,
+                    persist=context.get("ssh_control_persist", "30m"),
+                    keepalive=context.get("ssh_keepalive_interval", 30),
+                )
+                self.conn_cache[slurm_url] = self.connection
+            else:
+                LOGGER.debug("NEW connection connection")
+                self.connection = Connection(slurm_url)
+                self.conn_cache[slurm_url] = self.connection
 
-    def cache_code(self, experiment, archive_remote_path):
-        if not experiment.send_code:
-            return
-        if self._file_exists(archive_remote_path):
+    def _register(self, experiment, cmds):
+        """Records the sweep locally, so `mrunner status` can find it by job id."""
+        submission = experiment.submission
+        if submission.job_id is None:
             return
+        jobs = submission.jobs or {0: submission.job_id}
+        register_sweep(
+            {
+                "job_id": submission.job_id,
+                "jobs": jobs,
+                "array_sizes": {
+                    cmd.array_offset: cmd.array_size
+                    for cmd in cmds
+                    if cmd.array_offset in jobs
+                },
+                "backend_type": experiment.backend_type,
+                "slurm_url": experiment.slurm_url,
+                "context_name": experiment.context_name,
+                "name": experiment.name,
+                "unique_name": experiment.unique_name,
+                "grid_dir": submission.grid_dir,
+                "experiment_dir": submission.experiment_dir,
+                "script_path": submission.script_path,
+                "context": {
+                    f.name: getattr(experiment, f.name)
+                    for f in attr.fields(SlurmContext)
+                    if f.name != "cmd"
+                },
+            }
+        )
+
+    def status(self, sweep, tasks=None):
+        """Returns {task index: [state, elapsed, exit code]} of a registered sweep.
 
-        paths_to_copy = (
-            experiment.paths_to_copy if experiment.paths_to_copy is not None else []
+        All arrays of the sweep are queried with a single sacct call (squeue
+        if accounting is not available). tasks are states from an earlier
+        call; arrays whose tasks all reached a final state are not queried.
+        """
+        tasks = dict(tasks or {})
+        arrays = [
+            (job_id, int(offset), range(sweep["array_sizes"][offset]))
+            for offset, job_id in sweep["jobs"].items()
+        ]
+        arrays += [
+            (r["job_id"], r["offset"], r["indices"]) for r in sweep.get("retries", [])
+        ]
+        # the state of a task comes from the latest array that submitted it
+        owners = {}
+        for job_id, offset, indices in arrays:
+            for i in indices:
+                owners[offset + i] = job_id
+        to_query = {}
+        for job_id, offset, indices in arrays:
+            if any(
+                owners[offset + i] == job_id
+                and tasks.get(offset + i, [None])[0] not in FINAL_JOB_STATES
+                for i in indices
+            ):
+                to_query[job_id] = offset
+        if not to_query:
+            return tasks
+
+        self._connect(sweep["context"])
+        job_ids = ",".join(to_query)
+        result = self._fabric_run(
+            f"sacct -n -P -X -j {job_ids} --format=JobID,State,Elapsed,ExitCode",
+            warn=True,
+            hide=True,
         )
-        paths_to_copy.append(
-            rf"{experiment.cmd._experiment_config_path.dirname()}:{TMP_CONFIGS_DIR}"
+        if result.ok:
+            rows = [line.split("|") for line in result.stdout.splitlines()]
+        else:
+            LOGGER.warning("sacct failed, only tasks still in the queue are updated")
+            result = self._fabric_run(
+                f"squeue -h -r -j {job_ids} -o '%i|%T|%M'", warn=True, hide=True
+            )
+            rows = [line.split("|") + [""] for line in result.stdout.splitlines()]
+
+        for row in rows:
+            if len(row) < 4:
+                continue
+            job, state, elapsed, exit_code = row[:4]
+            job_id, _, index_spec = job.partition("_")
+            if job_id not in to_query:
+                continue
+            offset = to_query[job_id]
+            for index in parse_array_indices(index_spec):
+                if owners.get(offset + index) != job_id:
+                    continue
+                # e.g. "CANCELLED by 1234"
+                tasks[offset + index] = [
+                    state.split(" ")[0],
+                    elapsed,
+                    exit_code,
+                ]
+        return tasks
+
+    @staticmethod
+    def failed_indices(tasks):
+        """Indices of tasks that ended in a state other than COMPLETED."""
+        return sorted(i for i, task in tasks.items() if task[0] in FAILED_JOB_STATES)
+
+    def resubmit(self, sweep, indices):
+        """Submits tasks of a registered sweep again as sparse arrays.
+
+        The code tree, configs and experiment script of the sweep are
+        reused from the cluster, nothing is uploaded. Returns the submitted
+        arrays as [{"job_id", "offset", "indices"}], indices relative to
+        the offset.
+        """
+        context = sweep["context"]
+        self._connect(context)
+        # the submit command reads context options and the logs dir only
+        experiment = types.SimpleNamespace(
+            **context,
+            grid_logs_dir=Path(sweep["grid_dir"]) / context["grid_logs_dir_name"],
         )
-        paths_to_dump = get_paths_to_copy(
-            exclude=experiment.exclude, paths_to_copy=paths_to_copy
+        script_path = sweep["script_path"]
+        max_array_size = self._get_max_array_size(experiment)
+        by_offset = collections.defaultdict(list)
+        for index in sorted(set(indices)):
+            offset = index - index % max_array_size if max_array_size else 0
+            by_offset[offset].append(index - offset)
+        cmds = [
+            SlurmWrappersCmd(
+                experiment=experiment,
+                script_path=script_path,
+                array_size=None,
+                cmd_type="sbatch",
+                array_offset=offset,
+                array_indices=array_indices,
+            )
+            for offset, array_indices in sorted(by_offset.items())
+        ]
+        output = self._fabric_run(
+            f"if [ ! -f {script_path} ]; then"
+            f" echo 'Experiment script {script_path} not found' >&2; exit 1; fi;"
+            f" {_submit_cmd(cmds)}"
+        ).stdout
+        submission = SubmissionResult.from_output(output)
+        jobs = submission.jobs or {cmds[0].array_offset: submission.job_id}
+        return [
+            {
+                "job_id": jobs[cmd.array_offset],
+                "offset": cmd.array_offset,
+                "indices": cmd.array_indices,
+            }
+            for cmd in cmds
+        ]
+
+    def _get_max_array_size(self, experiment):
+        if experiment.max_array_size != "auto":
+            return experiment.max_array_size and int(experiment.max_array_size)
+        if experiment.slurm_url not in self.max_array_sizes:
+            output = self._fabric_run(
+                "scontrol show config", warn=True, hide=True
+            ).stdout
+            match = MAX_ARRAY_SIZE_RE.search(output)
+            if match is None:
+                LOGGER.warning("Could not read MaxArraySize, submitting one array")
+            self.max_array_sizes[experiment.slurm_url] = match and int(match.group(1))
+        return self.max_array_sizes[experiment.slurm_url]
+
+    def deploy_and_submit(self, experiment, script, cmds):
+        """Deploys the experiment and submits it in a single SSH exec.
+
+        A generated remote script creates the directories, unpacks the code,
+        configs and experiment script streamed to its stdin as one archive,
+        and runs the submit command. The remote code cache, delta sync and
+        asset store are not used in this mode.
+        """
+        if experiment.code_sync != "archive" or experiment.asset_size_threshold:
+            LOGGER.warning(
+                "deploy_mode=single ignores code_sync and asset_size_threshold"
+            )
+        entries = (
+            self._take_snapshot(experiment, with_digests=False)
+            if experiment.send_code
+            else []
         )
-        with tempfile.NamedTemporaryFile(suffix=".tar.gz") as temp_file:
-            # archive all files
-            with tarfile.open(temp_file.name, "w:gz") as tar_file:
-                for p in paths_to_dump:
-                    LOGGER.debug(
-                        'Adding "%s" to deployment archive', str(p.rel_remote_path)
+        base_dir = experiment.project_scratch_dir
+        code_dir = experiment.experiment_scratch_dir.relpath(base_dir)
+        configs_dir = experiment.grid_configs_dir.relpath(base_dir)
+        script_path = base_dir / script.script_name
+
+        markers_dir = experiment.stage_markers_dir
+        deploy_cmds = [
+            _extract_cmd(experiment, "-"),
+            f"mkdir -p {experiment.experiment_scratch_dir} {experiment.grid_logs_dir}",
+        ]
+        if experiment.send_code and experiment.task_workdir != "copy":
+            deploy_cmds.append(
+                f"(cd {experiment.experiment_scratch_dir}"
+                " && find . -type f -exec chmod a-w {} +)"
+            )
+        deploy_cmds.append(f"touch {markers_dir}/deploy")
+        remote_cmds = [
+            "set -e",
+            f"mkdir -p {base_dir} {markers_dir}",
+            f"cd {base_dir}",
+            # a retry after a completed deployment only skips the payload
+            f"if [ -f {markers_dir}/deploy ]; then cat > /dev/null;"
+            f" else {'; '.join(deploy_cmds)}; fi",
+            f"echo {RESULT_LINE_PREFIX}grid_dir={experiment.grid_scratch_dir}",
+            f"echo {RESULT_LINE_PREFIX}experiment_dir={experiment.experiment_scratch_dir}",
+            f"echo {RESULT_LINE_PREFIX}script_path={script_path}",
+            _submit_cmd(cmds, markers_dir),
+        ]
+
+        def write_payload(fileobj):
+            with open_compressed_writer(
+                fileobj,
+                experiment.compression,
+                level=experiment.compression_level,
+                threads=experiment.compression_threads,
+            ) as compressed_file:
+                with tarfile.open(fileobj=compressed_file, mode="w|") as tar_file:
+                    for entry in entries:
+                        arcname = f"{code_dir}/{entry.rel_remote_path}"
+                        if entry.link_target is not None:
+                            _add_link_to_tar(tar_file, arcname, entry.link_target)
+                        else:
+                            tar_file.add(
+                                entry.local_path, arcname=arcname, recursive=False
+                            )
+                    tar_file.add(
+                        experiment.cmd._experiment_config_path.dirname(),
+                        arcname=configs_dir,
                     )
-                    try:
-                        tar_file.add(p.local_path, arcname=p.rel_remote_path)
-                    except PermissionError:
-                        LOGGER.warning("Skipping %s: no access", str(p.local_path))
+                    tar_file.add(script.path, arcname=script.script_name)
 
-            # upload archive to cluster and extract
-            self._put(temp_file.name, archive_remote_path)
+        output = self._exec_with_payload(
+            "bash -c " + shlex.quote("\n".join(remote_cmds)), write_payload
+        )
+        return SubmissionResult.from_output(output)
+
+    def ensure_directories(self, experiment):
+        directories = [
+            experiment.experiment_scratch_dir,
+            experiment.grid_logs_dir,
+            experiment.stage_markers_dir,
+        ]
+        if not self.initialized:
+            directories.append(experiment.cache_dir)
+        self._fabric_run("mkdir -p " + " ".join(directories))
+        self.initialized = True
+
+    def cache_code(self, experiment):
+        """Makes the code snapshot available on the cluster and returns its remote path.
 
-    def deploy_code(self, experiment, archive_remote_path):
+        Archives are stored in the cache dir under the digest of their content,
+        so resubmitting unchanged code skips packing and uploading.
+        """
         if not experiment.send_code:
-            return
-        cd = f"cd {experiment.experiment_scratch_dir} ;  "
+            return None
+
+        digest_cache = DigestCache()
+        entries = self._take_snapshot(experiment, digest_cache=digest_cache)
+        digest_cache.save()
+        if experiment.asset_size_threshold is not None:
+            entries = self._store_assets(experiment, entries)
+
+        if experiment.code_sync == "delta":
+            tree_remote_path = experiment.grid_scratch_dir / DELTA_TREE_NAME
+            self._sync_delta(experiment, entries, tree_remote_path)
+            return tree_remote_path
+
+        archive_remote_path = experiment.cache_dir / (
+            snapshot_digest(entries) + experiment.archive_suffix
+        )
+        # touch marks the archive as recently used for the eviction policy
+        if self._fabric_run(
+            f"touch -c {archive_remote_path} && test -f {archive_remote_path}",
+            warn=True,
+        ).ok:
+            LOGGER.info("Code snapshot already cached as %s", archive_remote_path)
+            return archive_remote_path
+
+        tmp_remote_path = f"{archive_remote_path}.tmp-{id_generator(8)}"
+        with tracing.span("code.archive"), self._upload_archive(
+            experiment, tmp_remote_path
+        ) as tar_file:
+            for entry in entries:
+                LOGGER.debug('Adding "%s" to deployment archive', entry.rel_remote_path)
+                if entry.link_target is not None:
+                    _add_link_to_tar(tar_file, entry.rel_remote_path, entry.link_target)
+                else:
+                    tar_file.add(
+                        entry.local_path,
+                        arcname=entry.rel_remote_path,
+                        recursive=False,
+                    )
+        # rename is atomic, so concurrent submitters never see a partial archive
         self._fabric_run(
-            cd
-            + "tar xvf {tar_filename} > /dev/null".format(
-                tar_filename=archive_remote_path
+            f"mv -f {tmp_remote_path} {archive_remote_path} && "
+            + self._evict_cache_cmd(experiment, keep=archive_remote_path)
+        )
+        return archive_remote_path
+
+    def plan(self, experiments):
+        """Describes what run would submit, without connecting to the cluster."""
+        experiment = _SlurmExperiment(
+            **filter_only_attr(_SlurmExperiment, experiments[0]),
+        )
+        script = ExperimentScript(experiment, sweep_size=len(experiments))
+        if experiment.max_array_size == "auto":
+            LOGGER.warning("max_array_size=auto is not queried in the plan")
+        cmds = _array_cmds(
+            experiment,
+            experiment.project_scratch_dir / script.script_name,
+            len(experiments),
+            None if experiment.max_array_size == "auto" else experiment.max_array_size,
+        )
+        entries = (
+            self._take_snapshot(experiment, with_digests=False)
+            if experiment.send_code
+            else []
+        )
+        files = [e for e in entries if e.link_target is None]
+        dir_sizes = collections.Counter()
+        for e in files:
+            parts = e.rel_remote_path.split("/")[:-1]
+            for depth in range(1, len(parts) + 1):
+                dir_sizes["/".join(parts[:depth])] += e.size
+        threshold = (
+            parse_size(experiment.asset_size_threshold)
+            if experiment.asset_size_threshold is not None
+            else None
+        )
+        assets = [e for e in files if threshold is not None and e.size >= threshold]
+        configs = Path(experiment.cmd._experiment_config_path.dirname()).files()
+
+        cores = int(experiment.cpu or experiment.ntasks or 1)
+        cores *= experiment.experiments_per_task
+        minutes = parse_slurm_time(experiment.time)
+        tasks = sum(c.array_size for c in cmds)
+        with tracing.span("code.archive", plan=True):
+            archive_size = self._archive_size(experiment, files, assets)
+        return {
+            "experiments": len(experiments),
+            "tasks": tasks,
+            "arrays": [
+                f"{c.array_offset}+{c.array_str}" if c.array_offset else c.array_str
+                for c in cmds
+            ],
+            "files": len(files),
+            "size": sum(e.size for e in files),
+            "archive_size": archive_size,
+            "compression": experiment.compression,
+            "assets": len(assets),
+            "assets_size": sum(e.size for e in assets),
+            "largest_files": [
+                (e.rel_remote_path, e.size)
+                for e in heapq.nlargest(10, files, key=lambda e: e.size)
+            ],
+            "largest_dirs": dir_sizes.most_common(10),
+            "configs": len(configs),
+            "configs_size": sum(p.size for p in configs),
+            "cores": cores,
+            "time_minutes": minutes,
+            "core_hours": tasks * cores * minutes / 60,
+            "command": _submit_cmd(cmds),
+            "script": script.path.read_text(),
+        }
+
+    def _archive_size(self, experiment, files, assets):
+        """Packs the code archive run would upload and returns its size.
+
+        Assets are left out as they go to the asset store. Adaptive gzip
+        levels depend on the upload, the default level is used instead.
+        """
+        level = experiment.compression_level
+        if level is None and experiment.compression == "gzip":
+            level = DEFAULT_GZIP_LEVEL
+        sink = _CountingWriter()
+        asset_paths = {e.local_path for e in assets}
+        with open_compressed_writer(
+            sink,
+            experiment.compression,
+            level=level,
+            threads=experiment.compression_threads,
+        ) as compressed_file:
+            with tarfile.open(fileobj=compressed_file, mode="w|") as tar_file:
+                for entry in files:
+                    if entry.local_path not in asset_paths:
+                        tar_file.add(
+                            entry.local_path,
+                            arcname=entry.rel_remote_path,
+                            recursive=False,
+                        )
+        return sink.size
+
+    def _take_snapshot(self, experiment, digest_cache=None, with_digests=True):
+        ignore = (
+            MrunnerIgnore(experiment.mrunner_ignore)
+            if experiment.mrunner_ignore
+            else None
+        )
+        with tracing.span("get_paths_to_copy"):
+            paths_to_dump = get_paths_to_copy(
+                exclude=experiment.exclude,
+                paths_to_copy=experiment.paths_to_copy,
+                ignore=ignore,
+            )
+            tracing.count(paths=len(paths_to_dump))
+        with tracing.span("snapshot", digests=with_digests):
+            entries = take_snapshot(
+                paths_to_dump,
+                digest_cache=digest_cache,
+                ignore=ignore,
+                with_digests=with_digests,
+            )
+            tracing.count(files=len(entries), bytes=sum(e.size for e in entries))
+        return entries
+
+    def _store_assets(self, experiment, entries):
+        """Uploads large files to the content-addressed asset store.
+
+        Each asset is uploaded once per content digest; returned entries have
+        the large files replaced by links into the store.
+        """
+        threshold = parse_size(experiment.asset_size_threshold)
+        assets = {
+            e.digest: e for e in entries if e.digest is not None and e.size >= threshold
+        }
+        if not assets:
+            return entries
+
+        store_dir = experiment.assets_dir
+        missing = self._fabric_run(
+            f"mkdir -p {store_dir} && cd {store_dir} && for d in {' '.join(assets)};"
+            " do test -f $d || echo $d; done",
+            hide=True,
+        ).stdout.split()
+        LOGGER.info("Assets: %d large files, %d to upload", len(assets), len(missing))
+
+        if missing:
+            mv_cmds = []
+            for digest in missing:
+                tmp_remote_path = store_dir / f"{digest}.tmp-{id_generator(8)}"
+                self._put(assets[digest].local_path, tmp_remote_path)
+                mv_cmds.append(f"mv -f {tmp_remote_path} {store_dir / digest}")
+            self._fabric_run(
+                " && ".join(
+                    mv_cmds + [f"cd {store_dir}", f"chmod a-w {' '.join(missing)}"]
+                )
+            )
+
+        return [
+            (
+                e._replace(
+                    size=0, mode=0, digest=None, link_target=store_dir / e.digest
+                )
+                if e.digest in assets
+                else e
             )
+            for e in entries
+        ]
+
+    def send_configs(self, experiment, configs_remote_path):
+        configs_dir = experiment.cmd._experiment_config_path.dirname()
+        with tracing.span("configs.archive"), self._upload_archive(
+            experiment, configs_remote_path
+        ) as tar_file:
+            tar_file.add(configs_dir, arcname=experiment.grid_configs_dir_name)
+
+    def deploy_code(self, experiment, archive_remote_path, configs_remote_path):
+        cmds = []
+        if archive_remote_path is not None:
+            cmds.append(f"cd {experiment.experiment_scratch_dir}")
+            if experiment.code_sync == "delta":
+                cmds.append(
+                    "python3 -c {program} {tree} {blobs}".format(
+                        program=shlex.quote(DELTA_ASSEMBLE_PROGRAM),
+                        tree=archive_remote_path,
+                        blobs=experiment.delta_store_dir / "blobs",
+                    )
+                )
+            else:
+                cmds.append(_extract_cmd(experiment, archive_remote_path))
+            if experiment.task_workdir != "copy":
+                # array tasks link to this tree, make sure none of them modifies it
+                cmds.append("find . -type f -exec chmod a-w {} +")
+        cmds.append(
+            _extract_cmd(experiment, configs_remote_path, experiment.grid_scratch_dir)
         )
-        self._fabric_run(
-            f"mv {experiment.experiment_scratch_dir}/{TMP_CONFIGS_DIR} {experiment.grid_configs_dir}"
+        marker = experiment.stage_markers_dir / "deploy"
+        cmds.append(f"touch {marker}")
+        # the marker survives a connection lost after the command completed
+        self._fabric_run(f"test -f {marker} || ( {' && '.join(cmds)} )")
+
+    @contextlib.contextmanager
+    def _upload_archive(self, experiment, remote_path):
+        """Streams a tar archive into remote_path while it is being packed.
+
+        Compression runs in parallel blocks and overlaps with the transfer,
+        no local temporary file is written.
+        """
+        with self._open_remote(remote_path) as remote_file:
+            with open_compressed_writer(
+                remote_file,
+                experiment.compression,
+                level=experiment.compression_level,
+                threads=experiment.compression_threads,
+            ) as compressed_file:
+                with tarfile.open(fileobj=compressed_file, mode="w|") as tar_file:
+                    yield tar_file
+
+    def _evict_cache_cmd(self, experiment, keep):
+        """Evicts cached archives except keep, which counts towards the size."""
+        keep_name = shlex.quote(Path(keep).basename())
+        archives = (
+            "find . -maxdepth 1 -type f"
+            " \\( -name '*.tar.gz' -o -name '*.tar.zst' \\)"
+        )
+        cmds = [
+            f"cd {experiment.cache_dir}",
+            # leftovers of interrupted uploads
+            "find . -maxdepth 1 -type f -name '*.tmp-*' -mmin +1440 -delete",
+        ]
+        if experiment.cache_max_age_days is not None:
+            cmds.append(
+                f"{archives} ! -name {keep_name}"
+                f" -mtime +{int(experiment.cache_max_age_days)} -delete"
+            )
+        if experiment.cache_max_size is not None:
+            cmds.append(
+                f"{archives} -printf '%T@ %s %p\\n' | sort -rn"
+                f" | awk -v max={parse_size(experiment.cache_max_size)}"
+                f" -v keep=./{keep_name}"
+                " '{total += $2; if (total > max && $3 != keep) print $3}'"
+                " | xargs -r rm -f"
+            )
+        return " && ".join(cmds)
+
+    def _sync_delta(self, experiment, entries, tree_remote_path):
+        """Uploads blobs missing in the project's delta store and a tree manifest.
+
+        The store keeps one blob per content digest and a `manifest` listing
+        digests already present, so only new or changed files are sent.
+        """
+        store_dir = experiment.delta_store_dir
+        known_digests = set(
+            self._fabric_run(
+                f"mkdir -p {store_dir}/blobs && touch {store_dir}/manifest"
+                f" && cat {store_dir}/manifest",
+                hide=True,
+            ).stdout.split()
         )
 
+        missing = {}
+        for entry in entries:
+            if entry.digest is not None and entry.digest not in known_digests:
+                missing.setdefault(entry.digest, entry)
+        LOGGER.info(
+            "Delta sync: %d files, %d new blobs to upload", len(entries), len(missing)
+        )
+
+        if missing:
+            upload_name = f"upload_{experiment.unique_name}_{id_generator(4)}"
+            upload_path = store_dir / (upload_name + experiment.archive_suffix)
+            with self._upload_archive(experiment, upload_path) as tar_file:
+                for digest, entry in missing.items():
+                    tar_file.add(
+                        entry.local_path, arcname=f"blobs/{digest}", recursive=False
+                    )
+                _add_bytes_to_tar(
+                    tar_file,
+                    f"{upload_name}.digests",
+                    "".join(f"{d}\n" for d in missing).encode(),
+                )
+            self._fabric_run(
+                f"cd {store_dir} && {_extract_cmd(experiment, upload_path)}"
+                f" && cat {upload_name}.digests >> manifest"
+                f" && rm {upload_path} {upload_name}.digests"
+            )
+
+        rows = []
+        for entry in entries:
+            if entry.link_target is not None:
+                row = ("l", entry.link_target, "0", entry.rel_remote_path)
+            else:
+                row = ("f", entry.digest, oct(entry.mode), entry.rel_remote_path)
+            rows.append("\t".join(row) + "\n")
+        with self._open_remote(tree_remote_path) as remote_file:
+            remote_file.write("".join(rows).encode())
+        if (
+            experiment.cache_max_size is not None
+            or experiment.cache_max_age_days is not None
+        ):
+            self._fabric_run(self._evict_delta_cmd(experiment, tree_remote_path))
+
+    def _evict_delta_cmd(self, experiment, tree_remote_path):
+        """Evicts delta store blobs except the ones of tree_remote_path.
+
+        Blobs of the tree are touched first, so they count as recently used
+        towards the size and are never removed; the manifest is rebuilt from
+        the blobs left.
+        """
+        cmds = [
+            f"cd {experiment.delta_store_dir}",
+            f"awk -F '\\t' '$1 == \"f\" {{print \"blobs/\" $2}}' {tree_remote_path}"
+            " | xargs -r touch -c",
+            # leftovers of interrupted uploads
+            "find . -maxdepth 1 -type f -name 'upload_*' -mmin +1440 -delete",
+        ]
+        if experiment.cache_max_age_days is not None:
+            cmds.append(
+                "find blobs -type f"
+                f" -mtime +{int(experiment.cache_max_age_days)} -delete"
+            )
+        if experiment.cache_max_size is not None:
+            cmds.append(
+                "find blobs -type f -printf '%T@ %s %p\\n' | sort -rn"
+                f" | awk -v max={parse_size(experiment.cache_max_size)}"
+                # the first file is the tree, blob lines come from stdin
+                ' \'NR == FNR {split($0, f, "\\t");'
+                ' if (f[1] == "f") keep["blobs/" f[2]] = 1; next}'
+                " {total += $2; if (total > max && !($3 in keep)) print $3}'"
+                f" {tree_remote_path} - | xargs -r rm -f"
+            )
+        cmds.append("ls blobs > manifest.tmp && mv -f manifest.tmp manifest")
+        return " && ".join(cmds)
+
     def send_script(self, script, remote_script_path):
         self._put(script.path, remote_script_path)
 
     def _put(self, local_path, remote_path):
         LOGGER.info("SSH: put local file %s as remote %s", local_path, remote_path)
-        self.connection.put(local_path, remote_path)
+        with tracing.span("ssh.put", path=str(remote_path)):
+            self.connection.put(local_path, remote_path)
+            tracing.count(round_trips=1, bytes_sent=Path(local_path).size)
+
+    @contextlib.contextmanager
+    def _open_remote(self, remote_path):
+        LOGGER.info("SSH: streaming to remote file %s", remote_path)
+        with tracing.span("ssh.stream", path=str(remote_path)):
+            tracing.count(round_trips=1)
+            if isinstance(self.connection, ControlMasterConnection):
+                with self.connection.open_remote(remote_path) as remote_file:
+                    yield tracing.counted_writer(remote_file)
+                return
+            with self.connection.sftp().open(str(remote_path), "wb") as remote_file:
+                remote_file.set_pipelined(True)
+                yield tracing.counted_writer(remote_file)
+
+    def _exec_with_payload(self, cmd, write_payload):
+        """Runs cmd in one exec; write_payload(fileobj) streams into its stdin.
+
+        Goes through the paramiko channel directly, as fabric decodes stdin
+        as text. Output is echoed and returned; a non-zero exit status raises.
+        """
+        LOGGER.info("SSH: running command with streamed input '%s'", cmd)
+        with tracing.span("ssh.exec_with_payload"):
+            tracing.count(round_trips=1)
+            if isinstance(self.connection, ControlMasterConnection):
+                return self.connection.exec_with_payload(
+                    cmd, lambda fileobj: write_payload(tracing.counted_writer(fileobj))
+                )
+            self.connection.open()
+            channel = self.connection.client.get_transport().open_session()
+            channel.set_combine_stderr(True)
+            channel.exec_command(cmd)
+
+            chunks = []
+
+            def _read_output():
+                for chunk in iter(lambda: channel.recv(32768), b""):
+                    chunks.append(chunk)
+                    sys.stdout.write(chunk.decode(errors="replace"))
+
+            reader = threading.Thread(target=_read_output, daemon=True)
+            reader.start()
+            write_error = None
+            try:
+                write_payload(tracing.counted_writer(_ChannelWriter(channel)))
+            except OSError as e:
+                # the remote side stopped reading, its exit status tells why
+                write_error = e
+            finally:
+                channel.shutdown_write()
+            reader.join()
+            status = channel.recv_exit_status()
+            channel.close()
+
+            output = b"".join(chunks).decode(errors="replace")
+            if status != 0:
+                raise RuntimeError(
+                    f"Remote command exited with status {status}:\n{output}"
+                )
+            if write_error is not None:
+                raise write_error
+            return output
 
     def _ensure_dir(self, directory_path):
         self._fabric_run("mkdir -p {path}".format(path=directory_path))
 
-    def _fabric_run(self, cmd, warn=False):
+    def _fabric_run(self, cmd, warn=False, hide=None):
         LOGGER.info("SSH: running command '%s'", cmd)
-        return self.connection.run(cmd, warn=warn)
+        with tracing.span("ssh.run", cmd=cmd[:200]):
+            tracing.count(round_trips=1)
+            return self.connection.run(cmd, warn=warn, hide=hide)
 
     def _file_exists(self, fname):
         return self._fabric_run(f"stat {fname}", warn=True).ok
 
 
+def parse_slurm_time(time):
+    """Converts Slurm time limit ("minutes", "h:m:s", "d-h:m", ...) into minutes.
+
+    UNLIMITED and INFINITE give math.inf.
+    """
+    if str(time).strip().upper() in ("UNLIMITED", "INFINITE"):
+        return math.inf
+    days, _, time = str(time).rpartition("-")
+    parts = [float(p) for p in time.split(":")]
+    if days:
+        hours, minutes, seconds = (parts + [0, 0])[:3]
+    elif len(parts) == 3:
+        hours, minutes, seconds = parts
+    else:
+        hours, (minutes, seconds) = 0, (parts + [0])[:2]
+    return float(days or 0) * 24 * 60 + hours * 60 + minutes + seconds / 60
+
+
+def parse_array_indices(index_spec):
+    """Expands a Slurm array index spec ("3", "[0-5,7%2]") into indices."""
+    index_spec = index_spec.strip("[]").split("%")[0]
+    if not index_spec:
+        return [0]
+    indices = []
+    for part in index_spec.split(","):
+        first, _, last = part.partition("-")
+        indices.extend(range(int(first), int(last or first) + 1))
+    return indices
+
+
+def format_array_indices(indices, max_ranges=None):
+    """Formats sorted indices as a Slurm array index spec, e.g. "0-4,7".
+
+    Ranges after the first max_ranges are shortened to "...".
+    """
+    ranges = []
+    for index in indices:
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    text = ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges[:max_ranges])
+    if max_ranges is not None and len(ranges) > max_ranges:
+        text += ",..."
+    return text
+
+
+def _array_cmds(experiment, script_path, sweep_size, max_array_size=None):
+    """Submit commands of consecutive arrays of at most max_array_size tasks.
+
+    Each array task runs experiments_per_task experiments of the sweep.
+    """
+    array_size = -(-sweep_size // experiment.experiments_per_task)
+    chunk_size = int(max_array_size or array_size)
+    return [
+        SlurmWrappersCmd(
+            experiment=experiment,
+            script_path=script_path,
+            array_size=min(chunk_size, array_size - offset),
+            cmd_type=experiment.cmd_type,
+            array_offset=offset,
+        )
+        for offset in range(0, array_size, chunk_size)
+    ]
+
+
+def _scale_mem(mem, factor):
+    """Multiplies a Slurm memory request ("500", "5G", "1.5GiB", ...) by factor.
+
+    The result is in the largest unit that keeps it an integer, as Slurm
+    accepts no fractions; a number without unit is in megabytes.
+    """
+    if factor == 1:
+        return str(mem)
+    match = re.fullmatch(
+        r"(\d+(?:\.\d+)?)([KMGT]?)(?:i?B)?", str(mem).strip(), re.IGNORECASE
+    )
+    if match is None:
+        raise ValueError(f"Cannot scale memory request {mem} by {factor}")
+    number, unit = match.groups()
+    units = "KMGT"
+    kilobytes = round(float(number) * factor * 1024 ** units.index(unit.upper() or "M"))
+    for unit in reversed(units):
+        if kilobytes % 1024 ** units.index(unit) == 0:
+            return f"{kilobytes // 1024 ** units.index(unit)}{unit}"
+
+
+def _submit_cmd(cmds, markers_dir=None):
+    """Remote command running the submit commands, in parallel if there are many.
+
+    With several arrays, the job id of each is reported as a result line
+    keyed by its offset. With markers_dir, each array is submitted only if
+    it has no marker there yet, so repeating the command after a lost
+    connection never submits an array twice.
+    """
+    if len(cmds) == 1 and markers_dir is None:
+        return cmds[0].command
+    parts = []
+    for cmd in cmds:
+        marker = markers_dir and markers_dir / f"submit_{cmd.array_offset}"
+        if cmd._cmd == "sbatch":
+            if marker:
+                # the marker keeps the sbatch output to report it again
+                submit = (
+                    f"if [ -s {marker} ]; then out=$(cat {marker});"
+                    f' else out=$({cmd.command}) && echo "$out" > {marker}; fi'
+                )
+            else:
+                submit = f"out=$({cmd.command})"
+            part = (
+                f'{submit} && echo "$out"'
+                f" && echo {RESULT_LINE_PREFIX}job_{cmd.array_offset}=${{out##* }}"
+            )
+        elif marker:
+            part = f"[ -f {marker} ] || {{ {cmd.command} && touch {marker}; }}"
+        else:
+            part = cmd.command
+        parts.append(part)
+    if len(parts) == 1:
+        return "bash -c " + shlex.quote(parts[0])
+    script = "; ".join(
+        ["rc=0; pids="]
+        + [f'( {part} ) & pids="$pids $!"' for part in parts]
+        + ["for p in $pids; do wait $p || rc=1; done; exit $rc"]
+    )
+    return "bash -c " + shlex.quote(script)
+
+
+def _extract_cmd(experiment, archive_path, target_dir=None):
+    """Remote command extracting an archive, with pigz/zstd when available."""
+    if experiment.compression == "zstd":
+        decompress = f"zstd -dcq {archive_path}"
+    else:
+        decompress = (
+            f"if command -v pigz > /dev/null 2>&1; then pigz -dc {archive_path};"
+            f" else gzip -dc {archive_path}; fi"
+        )
+    target = f" -C {target_dir}" if target_dir else ""
+    return f"{{ {decompress}; }} | tar xf -{target}"
+
+
+class _CountingWriter(object):
+    """Write-only file object counting written bytes and dropping them."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+class _ChannelWriter(object):
+    """Write-only file object sending to the stdin of an SSH channel."""
+
+    def __init__(self, channel):
+        self._channel = channel
+
+    def write(self, data):
+        self._channel.sendall(data)
+        return len(data)
+
+
+def _add_link_to_tar(tar_file, arcname, link_target):
+    tar_info = tarfile.TarInfo(arcname)
+    tar_info.type = tarfile.SYMTYPE
+    tar_info.linkname = str(link_target)
+    tar_file.addfile(tar_info)
+
+
+def _add_bytes_to_tar(tar_file, arcname, payload):
+    tar_info = tarfile.TarInfo(arcname)
+    tar_info.size = len(payload)
+    tar_file.addfile(tar_info, io.BytesIO(payload))
+
+
 _slurm_backend = None
 
 
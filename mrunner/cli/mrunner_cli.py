@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
 import logging
+import math
 import tempfile
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pformat
 
 import click
@@ -12,8 +16,20 @@ from path import Path
 from mrunner.backends import get_backend
 from mrunner.cli.config import ConfigParser
 from mrunner.cli.config import context as context_cli
-from mrunner.experiment import generate_experiments
-from mrunner.utils.utils import WrapperCmd, validate_context
+from mrunner.experiment import (
+    generate_experiments,
+    get_experiments_list,
+    split_by_weights,
+)
+from mrunner.utils import tracing
+from mrunner.utils.sweep_registry import (
+    find_sweep,
+    load_sweep,
+    load_sweep_status,
+    save_sweep,
+    save_sweep_status,
+)
+from mrunner.utils.utils import WrapperCmd, format_size, pathify, validate_context
 
 LOGGER = logging.getLogger(__name__)
 
@@ -67,6 +83,21 @@ def _get_contexts(
     return [arg for arg in opts if arg.startswith(incomplete)]
 
 
+def parse_contexts(contexts):
+    """Parses "a,b:2,c:0.5" into [(name, weight)]; the default weight is 1."""
+    result = []
+    for item in contexts.split(","):
+        name, _, weight = item.strip().partition(":")
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError as exc:
+            raise click.BadParameter(f"Invalid weight of context {name}") from exc
+        if weight <= 0:
+            raise click.BadParameter(f"Weight of context {name} must be positive")
+        result.append((name, weight))
+    return result
+
+
 @click.group()
 @click.option(
     "-v",
@@ -93,7 +124,9 @@ def _get_contexts(
     type=str,
     default=None,
     help="Name of remote context to use "
-    '(if not provided, "contexts.current" conf key will be used)',
+    '(if not provided, "contexts.current" conf key will be used). '
+    'Several comma separated contexts with optional weights ("a,b:2") '
+    "split the sweep between them",
     shell_complete=_get_contexts,
 )
 @click.pass_context
@@ -117,34 +150,49 @@ def cli(ctx, verbose, config, context, **kwargs):
     LOGGER.debug("Using {} as mrunner config".format(config_path))
     config = ConfigParser(config_path).load()
 
-    cmd_require_context = ctx.invoked_subcommand not in ["context"]
+    # status and resubmit find the context of a sweep in its local record
+    cmd_require_context = ctx.invoked_subcommand not in [
+        "context",
+        "status",
+        "resubmit",
+    ]
+    contexts = []
     if cmd_require_context:
-        context_name = context or config.current_context or None
-        if not context_name:
+        context_names = context or config.current_context or None
+        if not context_names:
             raise click.ClickException(
                 'Provide context name (use CLI "--context" option or use "mrunner context set-active" command)'
             )
-        if context_name not in config.contexts:
-            raise click.ClickException(
-                f"Could not find predefined context: {context_name}. Use context add command."
-            )
-
-        try:
-            context = config.contexts[context_name]
-            res = {k: v for k, v in kwargs.items() if v is not None}
-            context.update(res)
-            LOGGER.info("Config to be used:")
-            LOGGER.info("\n %s", pformat(context))
-
-            context["context_name"] = context_name
-            validate_context(context)
-
-        except KeyError as exc:
-            raise click.ClickException(f"Unknown context {context_name}") from exc
-        except AttributeError as e:
-            raise click.ClickException(e)
 
-    ctx.obj = {"config_path": config_path, "config": config, "context": context}
+        for context_name, weight in parse_contexts(context_names):
+            if context_name not in config.contexts:
+                raise click.ClickException(
+                    f"Could not find predefined context: {context_name}. Use context add command."
+                )
+
+            try:
+                context = config.contexts[context_name]
+                res = {k: v for k, v in kwargs.items() if v is not None}
+                context.update(res)
+                LOGGER.info("Config to be used:")
+                LOGGER.info("\n %s", pformat(context))
+
+                context["context_name"] = context_name
+                validate_context(context)
+
+            except KeyError as exc:
+                raise click.ClickException(f"Unknown context {context_name}") from exc
+            except AttributeError as e:
+                raise click.ClickException(e)
+            contexts.append((context, weight))
+        context = contexts[0][0]
+
+    ctx.obj = {
+        "config_path": config_path,
+        "config": config,
+        "context": context,
+        "contexts": contexts,
+    }
 
 
 @cli.command()
@@ -153,40 +201,264 @@ def cli(ctx, verbose, config, context, **kwargs):
     default="experiments_list",
     help="Name of function providing experiment specification",
 )
+@click.option(
+    "--plan",
+    is_flag=True,
+    default=False,
+    help="Only report what would be submitted, without connecting to the cluster",
+)
+@click.option(
+    "--trace",
+    "trace_path",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Write wall time, bytes, files, SSH round trips and peak memory "
+    "of submission stages to this file",
+)
+@click.option(
+    "--trace-format",
+    default="chrome",
+    type=click.Choice(tracing.TRACE_FORMATS),
+    help="chrome (for chrome://tracing or Perfetto) or json (list of spans)",
+)
+@click.option(
+    "--trace-memory/--no-trace-memory",
+    default=True,
+    help="Measure peak memory of traced stages (tracemalloc slows down Python)",
+)
 @click.argument(
     "script",
     type=click.Path(dir_okay=False),
 )
 @click.argument("params", nargs=-1)
 @click.pass_context
-def run(ctx, spec, script, params):
+def run(ctx, spec, plan, trace_path, trace_format, trace_memory, script, params):
     """Run experiment"""
+    if trace_path is None:
+        return _run(ctx, spec, plan, script, params)
+
+    tracing.enable(trace_memory=trace_memory)
+    try:
+        with tracing.span("run", script=str(script)):
+            return _run(ctx, spec, plan, script, params)
+    finally:
+        tracing.write_trace(trace_path, fmt=trace_format)
+        _print_trace_summary(tracing.summary())
+        click.echo(f"Trace written to {trace_path}")
+        tracing.disable()
+
 
-    context = ctx.obj["context"]
+def _run(ctx, spec, plan, script, params):
+    contexts = ctx.obj["contexts"]
 
     tmp_dir = tempfile.TemporaryDirectory()
     dump_dir = Path(tmp_dir.name)
-    experiments = []
 
-    for config_path, experiment in generate_experiments(
-        script, context, spec=spec, dump_dir=dump_dir
-    ):
-        # TODO(mo): Can cmd be created and passed any other way?
-        cmd = " ".join([experiment["script"]] + list(params))
-        experiment["cmd"] = WrapperCmd(cmd=cmd, experiment_config_path=config_path)
+    if len(contexts) == 1:
+        selections = [slice(None)]
+    else:
+        selections = split_by_weights(
+            len(get_experiments_list(script, spec)), [w for _, w in contexts]
+        )
+
+    sweeps = []
+    for (context, _), select in zip(contexts, selections):
+        context_dump_dir = dump_dir
+        if len(contexts) > 1:
+            # config indexes restart from 0 in each context
+            context_dump_dir = dump_dir / context["context_name"]
+            context_dump_dir.makedirs_p()
+        experiments = []
+        with tracing.span("generate_experiments", context=context["context_name"]):
+            for config_path, experiment in generate_experiments(
+                script, context, spec=spec, dump_dir=context_dump_dir, select=select
+            ):
+                if experiments and experiment is experiments[-1]:
+                    # entries of a lazy config bundle share one experiment
+                    experiments.append(experiment)
+                    continue
+                # TODO(mo): Can cmd be created and passed any other way?
+                cmd = " ".join([experiment["script"]] + list(params))
+                experiment["cmd"] = WrapperCmd(
+                    cmd=cmd,
+                    experiment_config_path=config_path,
+                    config_bundle=context.get("config_bundle", False),
+                )
+                if len(contexts) > 1:
+                    # contexts may share a cluster and storage_dir, config
+                    # indexes restart from 0 in each one - separate grid dirs
+                    experiment["unique_name"] += "-" + pathify(context["context_name"])
+
+                experiments.append(experiment)
+        if experiments:
+            sweeps.append((context, experiments))
+        else:
+            LOGGER.warning(
+                "No experiments left for context %s", context["context_name"]
+            )
+
+    if plan:
+        for context, experiments in sweeps:
+            backend = get_backend(context["backend_type"])
+            if not hasattr(backend, "plan"):
+                raise click.ClickException(
+                    f"--plan is not supported by the {context['backend_type']} backend"
+                )
+            if len(sweeps) > 1:
+                click.echo(f"Context:         {context['context_name']}")
+            _print_plan(backend.plan(experiments))
+        return
+
+    failed = []
+    if len(sweeps) == 1:
+        results = [_run_with_retries(sweeps[0][1])]
+    else:
+        # each cluster gets its own thread and backend instance, so a slow
+        # snapshot upload or submission to one does not hold up the others
+        with ThreadPoolExecutor(max_workers=len(sweeps)) as executor:
+            futures = [
+                executor.submit(_run_with_retries, experiments, shared=False)
+                for _, experiments in sweeps
+            ]
+        results = []
+        for (context, _), future in zip(sweeps, futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                failed.append(context["context_name"])
+
+    # Call the registered callbacks.
+    for result in results:
+        if result is not None:
+            (sweep, experiments) = result
+            for callback in after_run_callbacks:
+                callback(sweep, experiments)
+
+    if failed:
+        raise RuntimeError(f"Failed to submit to contexts: {', '.join(failed)}")
+
+
+@cli.command()
+@click.argument("sweep", required=False)
+@click.option(
+    "--ttl",
+    default=60,
+    type=float,
+    help="Seconds during which cached task states are shown without querying",
+)
+@click.option("--tasks", "show_tasks", is_flag=True, help="Show every task")
+@click.pass_context
+def status(ctx, sweep, ttl, show_tasks):
+    """Show states of tasks of a sweep (given by its job id, the latest by default)"""
+    record_path = find_sweep(sweep)
+    if record_path is None:
+        raise click.ClickException(f"Unknown sweep {sweep or ''}".strip())
+    record = load_sweep(record_path)
+    # pylint: disable=import-outside-toplevel
+    from mrunner.backends.slurm import format_array_indices
+
+    cached = load_sweep_status(record_path)
+    updated, tasks = cached or (None, {})
+    if updated is None or time.time() - updated > ttl:
+        tasks = get_backend(record["backend_type"]).status(record, tasks)
+        save_sweep_status(record_path, tasks)
+        updated = time.time()
+
+    size = sum(record["array_sizes"].values())
+    click.echo(
+        f"Sweep {record['job_id']}: {record['name']} ({record['unique_name']})"
+        f" on {record['context_name']}, {size} tasks"
+    )
+    click.echo(f"  {record['grid_dir']}")
+    by_state = collections.defaultdict(list)
+    for index in range(size):
+        by_state[tasks.get(index, ["UNKNOWN"])[0]].append(index)
+    for state, indices in sorted(by_state.items()):
+        click.echo(
+            f"  {state:<14}{len(indices):>7}  {format_array_indices(indices, max_ranges=10)}"
+        )
+    click.echo(f"(as of {time.time() - updated:.0f}s ago)")
+
+    if show_tasks:
+        click.echo(f"{'task':>7}  {'state':<14}{'elapsed':>12}  exit code")
+        for index in range(size):
+            state, elapsed, exit_code = tasks.get(index, ["UNKNOWN", "", ""])
+            click.echo(f"{index:>7}  {state:<14}{elapsed:>12}  {exit_code}")
 
-        experiments.append(experiment)
 
-    num_of_retries = 5
-    ok = None
-    result = None
-    for _ in range(num_of_retries):
+@cli.command()
+@click.argument("sweep", required=False)
+@click.option(
+    "--failed",
+    is_flag=True,
+    help="Resubmit tasks that ended in a state other than COMPLETED",
+)
+@click.option("--indices", default=None, help='Tasks to resubmit, e.g. "3,17,40-45"')
+@click.pass_context
+def resubmit(ctx, sweep, failed, indices):
+    """Submit tasks of a sweep (the latest by default) again, reusing its code and configs"""
+    if failed == (indices is not None):
+        raise click.UsageError("Provide either --failed or --indices")
+    record_path = find_sweep(sweep)
+    if record_path is None:
+        raise click.ClickException(f"Unknown sweep {sweep or ''}".strip())
+    record = load_sweep(record_path)
+    # pylint: disable=import-outside-toplevel
+    from mrunner.backends.slurm import format_array_indices, parse_array_indices
+
+    backend = get_backend(record["backend_type"])
+    if not hasattr(backend, "resubmit"):
+        raise click.ClickException(
+            f"resubmit is not supported by the {record['backend_type']} backend"
+        )
+
+    size = sum(record["array_sizes"].values())
+    _, tasks = load_sweep_status(record_path) or (None, {})
+    if failed:
+        tasks = backend.status(record, tasks)
+        save_sweep_status(record_path, tasks)
+        to_resubmit = backend.failed_indices(tasks)
+    else:
         try:
-            result = get_backend(experiment["backend_type"]).run(
-                experiments=experiments
-            )
-            ok = True
-            break
+            to_resubmit = sorted(set(parse_array_indices(indices)))
+        except ValueError as exc:
+            raise click.BadParameter(f"Invalid indices {indices}") from exc
+        if to_resubmit and to_resubmit[-1] >= size:
+            raise click.BadParameter(f"The sweep has only {size} tasks")
+    if not to_resubmit:
+        click.echo("No tasks to resubmit")
+        return
+
+    retries = backend.resubmit(record, to_resubmit)
+    record.setdefault("retries", []).extend(retries)
+    save_sweep(record_path, record)
+    # states of the previous attempts are stale now
+    for index in to_resubmit:
+        tasks.pop(index, None)
+    save_sweep_status(record_path, tasks, updated=0)
+    click.echo(
+        f"Resubmitted {len(to_resubmit)} tasks of sweep {record['job_id']}"
+        f" ({format_array_indices(to_resubmit, max_ranges=10)}) as job(s)"
+        f" {', '.join(r['job_id'] for r in retries)}"
+    )
+
+
+def _run_with_retries(experiments, shared=True, num_of_retries=5, backoff=1.0):
+    """Runs the backend, retrying with exponential backoff.
+
+    The Slurm backend resumes a retried submission from the stage that failed.
+    """
+    backend = get_backend(experiments[0]["backend_type"], shared=shared)
+    for attempt in range(num_of_retries):
+        if attempt:
+            time.sleep(min(backoff * 2 ** (attempt - 1), 60))
+        try:
+            with tracing.span(
+                "backend.run",
+                context=experiments[0]["context_name"],
+                attempt=attempt,
+            ):
+                return backend.run(experiments=experiments)
         except Exception as e:
             LOGGER.error(
                 "Caught exception: %s. Retrying until %d times.\n%s",
@@ -194,15 +466,78 @@ def run(ctx, spec, script, params):
                 num_of_retries,
                 traceback.format_exc(),
             )
-            ok = False
-    if not ok:
-        raise RuntimeError(f"Failed for {num_of_retries} times. Give up.")
-
-    # Call the registered callbacks.
-    if result is not None:
-        (sweep, experiments) = result
-        for callback in after_run_callbacks:
-            callback(sweep, experiments)
+    raise RuntimeError(f"Failed for {num_of_retries} times. Give up.")
+
+
+def _print_trace_summary(rows):
+    click.echo(
+        f"{'stage':<24}{'calls':>7}{'time [s]':>10}{'RTs':>6}{'files':>8}"
+        f"{'bytes':>10}{'sent':>10}{'peak mem':>10}"
+    )
+    for name, calls, total, counters in rows:
+        # missing without --trace-memory
+        peak_memory = (
+            format_size(counters["peak_memory"]) if "peak_memory" in counters else "-"
+        )
+        click.echo(
+            f"{name:<24}{calls:>7}{total:>10.3f}{counters['round_trips']:>6}"
+            f"{counters['files']:>8}{format_size(counters['bytes']):>10}"
+            f"{format_size(counters['bytes_sent']):>10}"
+            f"{peak_memory:>10}"
+        )
+
+
+def _print_plan(report):
+    click.echo(
+        "Experiments:     {} in {} array(s): {}".format(
+            report["experiments"], len(report["arrays"]), ", ".join(report["arrays"])
+        )
+    )
+    click.echo(
+        "Code snapshot:   {} files, {} ({} archive {})".format(
+            report["files"],
+            format_size(report["size"]),
+            report["compression"],
+            format_size(report["archive_size"]),
+        )
+    )
+    if report["assets"]:
+        click.echo(
+            "  asset store:   {} files, {}".format(
+                report["assets"], format_size(report["assets_size"])
+            )
+        )
+    click.echo(
+        "Configs:         {} files, {}".format(
+            report["configs"], format_size(report["configs_size"])
+        )
+    )
+    if math.isinf(report["time_minutes"]):
+        click.echo(
+            "Estimated usage: unbounded ({} x {} cores, no time limit)".format(
+                report["tasks"], report["cores"]
+            )
+        )
+    else:
+        click.echo(
+            "Estimated usage: {:.1f} core-hours (at most {} x {} cores x {:g} min)".format(
+                report["core_hours"],
+                report["tasks"],
+                report["cores"],
+                report["time_minutes"],
+            )
+        )
+    for title, items in [
+        ("Largest files:", report["largest_files"]),
+        ("Largest directories:", report["largest_dirs"]),
+    ]:
+        click.echo(title)
+        for path, size in items:
+            click.echo(f"  {format_size(size):>10}  {path}")
+    click.echo("Submit command:")
+    click.echo(f"  {report['command']}")
+    click.echo("Experiment script:")
+    click.echo(report["script"])
 
 
 cli.add_command(context_cli)
@@ -1,13 +1,24 @@
 # -*- coding: utf-8 -*-
+import collections
+import copy
 import logging
+import multiprocessing
 import re
-from typing import Any, Generator
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Generator, Optional
 
 import attr
 import cloudpickle
 from attrs import Factory, define, field
 from path import Path
 
+from mrunner.utils import tracing
+from mrunner.utils.config_bundle import (
+    CONFIG_BUNDLE_NAME,
+    write_config_bundle,
+    write_lazy_config_bundle,
+)
 from mrunner.utils.namesgenerator import get_random_name, get_unique_name
 from mrunner.utils.utils import WrapperCmd
 
@@ -21,6 +32,8 @@ class ContextBase:
     storage_dir: Path
     cmd: WrapperCmd = None
     cwd: Path = Factory(Path.getcwd)
+    # processes writing config files of a sweep (forked, not on Windows)
+    config_workers: Optional[int] = None
 
 
 def values_to_str(d: dict[str, Any]) -> dict[str, str]:
@@ -44,11 +57,80 @@ class Experiment(object):
     with_mpi: Any = field(default=False)
     restore_from_path: Any = field(default=None)
     send_code: Any = field(default=True)
+    mrunner_ignore: Any = field(default=None)
 
     def to_dict(self):
         return attr.asdict(self)
 
 
+SWEEP_RECORD_FIELDS = ("name", "parameters", "restore_from_path", "send_code")
+
+
+class _SweepRecord(object):
+    __slots__ = SWEEP_RECORD_FIELDS
+
+    def __init__(self, name, parameters, restore_from_path, send_code):
+        self.name = name
+        self.parameters = parameters
+        self.restore_from_path = restore_from_path
+        self.send_code = send_code
+
+
+class Sweep(Sequence):
+    """Experiments sharing all fields but the ones of SWEEP_RECORD_FIELDS.
+
+    The shared fields (env, tags, git_info, ...) are stored once and every
+    experiment is a record of its own fields. Unlike a list, a sweep is not
+    modified in place. Indexing builds a new Experiment: attributes set on
+    it are not kept, while its parameters and mutable shared values (e.g.
+    the tags list, the same for all experiments) are the sweep's own objects.
+    Slices are sweeps.
+    """
+
+    def __init__(self, **shared_fields):
+        # fields missing from shared_fields get Experiment defaults
+        prototype = Experiment(parameters=None, **shared_fields)
+        self._fields = prototype.to_dict()
+        self._records = []
+
+    def add(self, parameters, restore_from_path=None, send_code=True, name=None):
+        self._records.append(
+            _SweepRecord(
+                self._fields["name"] if name is None else name,
+                parameters,
+                restore_from_path,
+                send_code,
+            )
+        )
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sweep = copy.copy(self)
+            sweep._records = self._records[index]
+            return sweep
+        return Experiment(**self._record_dict(self._records[index]))
+
+    def _record_dict(self, record):
+        fields = dict(self._fields)
+        for name in SWEEP_RECORD_FIELDS:
+            fields[name] = getattr(record, name)
+        return fields
+
+    def to_dicts(self, start=0, stop=None):
+        """Yields Experiment.to_dict() of experiments, sharing common fields."""
+        for record in self._records[start:stop]:
+            yield self._record_dict(record)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+
 def _merge_experiment_parameters(cli_kwargs, context):
     config = context.copy()
     for k, v in cli_kwargs.items():
@@ -72,43 +154,199 @@ def _merge_experiment_parameters(cli_kwargs, context):
     return config
 
 
-def _load_py_experiment(script, spec, *, dump_dir: Path):
+def _sanitized_spec_params(spec_params):
+    spec_params["name"] = re.sub(r"[ .,_:;-]+", "-", spec_params["name"].lower())
+    return spec_params
+
+
+def _experiment_dicts(experiments, start=0, stop=None):
+    if isinstance(experiments, Sweep):
+        return experiments.to_dicts(start, stop)
+    if start == 0 and stop is None:
+        return (experiment.to_dict() for experiment in experiments)
+    stop = len(experiments) if stop is None else stop
+    return (experiments[i].to_dict() for i in range(start, stop))
+
+
+def _dump_config(spec_params, dump_dir: Path, idx: int):
+    config_path = dump_dir / f"config_{idx}"
+    with open(config_path, "wb") as file:
+        cloudpickle.dump(spec_params, file, protocol=4)
+        return config_path, file.tell()
+
+
+# experiments of the sweep being dumped, inherited by forked workers
+_forked_experiments = None
+CONFIG_CHUNK_SIZE = 256
+
+
+def _dump_config_chunk(dump_dir, start, stop):
+    chunk, size = [], 0
+    dicts = _experiment_dicts(_forked_experiments, start, stop)
+    for idx, spec_params in enumerate(dicts, start):
+        spec_params = _sanitized_spec_params(spec_params)
+        size += _dump_config(spec_params, dump_dir, idx)[1]
+        chunk.append(spec_params)
+    # returned as one pickle, objects shared by experiments are sent once
+    return chunk, size
+
+
+def _dump_configs_in_pool(experiments, dump_dir: Path, workers: int):
+    """Yields (config path, spec params) in order, config files written by workers.
+
+    Workers get ranges of indices of the experiments, inherited through
+    fork, build, sanitize and pickle their configs and send the spec params
+    back. At most two chunks per worker are in flight.
+    """
+    global _forked_experiments
+    n = len(experiments)
+    chunk_size = max(1, min(CONFIG_CHUNK_SIZE, -(-n // (4 * workers))))
+    starts = iter(range(0, n, chunk_size))
+    _forked_experiments = experiments
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            pending = collections.deque()
+
+            def submit():
+                start = next(starts, None)
+                if start is not None:
+                    stop = min(start + chunk_size, n)
+                    future = pool.submit(_dump_config_chunk, dump_dir, start, stop)
+                    pending.append((start, stop, future))
+
+            for _ in range(2 * workers):
+                submit()
+            while pending:
+                start, stop, future = pending.popleft()
+                chunk, size = future.result()
+                submit()
+                tracing.count(files=stop - start, bytes=size)
+                for idx, spec_params in enumerate(chunk, start):
+                    yield dump_dir / f"config_{idx}", spec_params
+    finally:
+        _forked_experiments = None
+
+
+class _LazySpecParams(object):
+    """Spec params of experiments of a lazy sequence, built on access."""
+
+    def __init__(self, experiments):
+        self.experiments = experiments
+
+    def __len__(self):
+        return len(self.experiments)
+
+    def __getitem__(self, index):
+        return _sanitized_spec_params(self.experiments[index].to_dict())
+
+
+def _load_py_experiment(
+    script, spec, *, dump_dir: Path, config_bundle=False, select=None, workers=None
+):
     LOGGER.info(
         "Found {} function in {}; will use it as experiments configuration generator".format(
             spec, script
         )
     )
 
-    def _create_and_dump_config(spec_params, dump_dir: Path, idx: int):
-        config_path = dump_dir / f"config_{idx}"
-        with open(config_path, "wb") as file:
-            cloudpickle.dump(spec_params, file, protocol=4)
-
-        return config_path
+    from mrunner.helpers.param_grid import ExperimentGrid
 
     experiments_list = get_experiments_list(script, spec)
-    for idx, experiment in enumerate(experiments_list):
-        spec_params = experiment.to_dict()
-        spec_params["name"] = re.sub(r"[ .,_:;-]+", "-", spec_params["name"].lower())
+    lazy = isinstance(experiments_list, ExperimentGrid)
+    if select is not None:
+        # slices of a lazy grid or a sweep are not expanded
+        if not isinstance(experiments_list, (ExperimentGrid, Sweep)):
+            experiments_list = list(experiments_list)
+        experiments_list = experiments_list[select]
+    if config_bundle and lazy:
+        # only the grid definition is shipped, array tasks build their configs;
+        # backends read the first experiment and the size of the sweep
+        bundle_path = dump_dir / CONFIG_BUNDLE_NAME
+        with tracing.span("config_bundle.write", lazy=True):
+            write_lazy_config_bundle(bundle_path, _LazySpecParams(experiments_list))
+            tracing.count(files=1, bytes=bundle_path.size)
+        if len(experiments_list):
+            spec_params = _sanitized_spec_params(experiments_list[0].to_dict())
+            for _ in range(len(experiments_list)):
+                yield bundle_path, spec_params
+        return
+    if config_bundle:
+        # all configs go to a single file, written before any is yielded
+        all_spec_params = [
+            _sanitized_spec_params(d) for d in _experiment_dicts(experiments_list)
+        ]
+        bundle_path = dump_dir / CONFIG_BUNDLE_NAME
+        with tracing.span("config_bundle.write"):
+            write_config_bundle(bundle_path, all_spec_params)
+            tracing.count(files=1, bytes=bundle_path.size)
+        for spec_params in all_spec_params:
+            yield bundle_path, spec_params
+        return
+
+    if workers and workers > 1:
+        if "fork" in multiprocessing.get_all_start_methods():
+            if not isinstance(experiments_list, Sequence):
+                experiments_list = list(experiments_list)
+            yield from _dump_configs_in_pool(experiments_list, dump_dir, workers)
+            return
+        LOGGER.warning("config_workers needs the fork start method, ignoring it")
+
+    for idx, spec_params in enumerate(_experiment_dicts(experiments_list)):
+        spec_params = _sanitized_spec_params(spec_params)
 
-        config_path = _create_and_dump_config(spec_params, dump_dir, idx)
+        with tracing.span("config.pickle"):
+            config_path, size = _dump_config(spec_params, dump_dir, idx)
+            tracing.count(files=1, bytes=size)
 
         yield config_path, spec_params
 
 
 def generate_experiments(
-    script: str, context: dict, *, spec="spec", dump_dir=None
+    script: str, context: dict, *, spec="spec", dump_dir=None, select=None
 ) -> Generator[tuple[str, dict], Any, None]:
-    experiments = _load_py_experiment(script, spec=spec, dump_dir=dump_dir)
+    """Yields (config path, experiment) pairs; select (a slice) limits the sweep."""
+    experiments = _load_py_experiment(
+        script,
+        spec=spec,
+        dump_dir=dump_dir,
+        config_bundle=context.get("config_bundle", False),
+        select=select,
+        workers=context.get("config_workers"),
+    )
 
+    merged_spec_params = experiment = None
     for config_path, spec_params in experiments:
-        experiment = _merge_experiment_parameters(spec_params, context)
+        # entries of a lazy config bundle share the same spec params
+        if spec_params is not merged_spec_params:
+            experiment = _merge_experiment_parameters(spec_params, context)
+            merged_spec_params = spec_params
         yield config_path, experiment
 
 
 _experiment_list = None
 
 
+def split_by_weights(size, weights):
+    """Splits range(size) into consecutive slices proportional to weights."""
+    total = sum(weights)
+    quotas = [size * w / total for w in weights]
+    counts = [int(q) for q in quotas]
+    # largest remainders get the experiments left after rounding down
+    by_remainder = sorted(
+        range(len(weights)), key=lambda i: quotas[i] - counts[i], reverse=True
+    )
+    for i in by_remainder[: size - sum(counts)]:
+        counts[i] += 1
+
+    slices, start = [], 0
+    for count in counts:
+        slices.append(slice(start, start + count))
+        start += count
+    return slices
+
+
 def get_experiments_list(script, spec):
     global _experiment_list
     if _experiment_list is None:
@@ -116,7 +354,8 @@ def get_experiments_list(script, spec):
             "script": str(Path(script).name),
             "__file__": str(Path(script)),
         }
-        exec(open(script).read(), vars)
+        with tracing.span("spec.load", script=str(script)):
+            exec(open(script).read(), vars)
         _experiment_list = vars.get(spec, None)
         if _experiment_list is None:
             print(
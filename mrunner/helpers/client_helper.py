@@ -10,6 +10,8 @@ import socket
 import cloudpickle
 from munch import Munch
 
+from mrunner.utils.config_bundle import ConfigBundle, is_config_bundle
+
 experiment_ = None
 logger_ = logging.getLogger(__name__)
 
@@ -76,6 +78,7 @@ def get_configuration(
     env_to_properties_regexp=".*PWD",
     config_file=None,
     inject_parameters_to_FLAGS=False,
+    config_index=None,
 ):
     # with_neptune might be also an id of an experiment
     global experiment_
@@ -84,7 +87,10 @@ def get_configuration(
         parser = argparse.ArgumentParser(description="Debug run.")
         parser.add_argument("--ex", type=str, default="")
         parser.add_argument("--config", type=str, default="")
+        parser.add_argument("--config_index", type=int, default=None)
         commandline_args = parser.parse_args()
+        if commandline_args.config_index is not None:
+            config_index = commandline_args.config_index
 
         params = None
         experiment = None
@@ -104,7 +110,7 @@ def get_configuration(
                 )
             )
             experiment = experiments[0]
-            params = experiment.parameters
+            params = Munch(experiment.parameters)
 
     configuration = None
     if config_file is not None:
@@ -115,8 +121,18 @@ def get_configuration(
     # This is here for running remotely, load experiment from dump
     if configuration is not None:
         logger_.info("File to load:{}".format(configuration))
-        with open(configuration, "rb") as f:
-            experiment = Munch(cloudpickle.load(f))
+        if is_config_bundle(configuration):
+            if config_index is None:
+                config_index = int(
+                    os.environ.get("MRUNNER_TASK_ID")
+                    or os.environ["SLURM_ARRAY_TASK_ID"]
+                )
+            bundle = ConfigBundle(configuration)
+            experiment = Munch(bundle[config_index])
+            bundle.close()
+        else:
+            with open(configuration, "rb") as f:
+                experiment = Munch(cloudpickle.load(f))
         params = Munch(experiment["parameters"])
         git_info = experiment.get("git_info", None)
         if git_info:
@@ -0,0 +1,306 @@
+"""Parameter grids addressable by the index of a combination.
+
+A grid is never expanded: its length is the product of the axis lengths,
+and a combination is decoded from its index in mixed radix, so a
+definition of a million-point sweep is as small as its axes. Samples of a
+grid keep only the indices of the sampled combinations.
+"""
+
+import array
+import logging
+import math
+import random
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+
+from mrunner.experiment import Experiment, Sweep, split_by_weights
+from mrunner.utils.layered_config import LayeredConfig
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLING_STRATEGIES = ("random", "lhs", "halton", "sobol")
+
+
+def get_container_types():
+    ret = [list, tuple]
+    try:
+        import numpy as np
+
+        ret.append(np.ndarray)
+    except ImportError:
+        pass
+    try:
+        import pandas as pd
+
+        ret.append(pd.Series)
+    except ImportError:
+        pass
+    return tuple(ret)
+
+
+class _SubGrid(object):
+    """Product of axes, repeated for every value of the zipped (`___`) keys."""
+
+    def __init__(self, param_grid):
+        allowed_container_types = get_container_types()
+        self.zipped_keys = []
+        zipped_axes = []
+        self.keys = []
+        self.axes = []
+        for key, grid in param_grid.items():
+            assert isinstance(
+                grid, allowed_container_types
+            ), "grid values should be passed in one of given types: {}, got {} ({})".format(
+                allowed_container_types, type(grid), grid
+            )
+            if "___" in key:
+                self.zipped_keys.append(key[:-3])
+                zipped_axes.append(list(grid))
+            else:
+                self.keys.append(key)
+                self.axes.append(list(grid))
+        self.zipped_values = list(zip(*zipped_axes)) if zipped_axes else [()]
+        self.product_size = 1
+        for axis in self.axes:
+            self.product_size *= len(axis)
+        self.size = len(self.zipped_values) * self.product_size
+
+    @property
+    def dims(self):
+        """Sizes of the dimensions: the zipped values and every product axis."""
+        return [len(self.zipped_values)] + [len(axis) for axis in self.axes]
+
+    def index(self, dim_indices):
+        """Index of the combination of given value indices of dims."""
+        index = 0
+        for size, dim_index in zip(self.dims, dim_indices):
+            index = index * size + dim_index
+        return index
+
+    def combination(self, index):
+        zipped_index, index = divmod(index, self.product_size)
+        values = []
+        # the last axis changes fastest, as in itertools.product
+        for axis in reversed(self.axes):
+            index, value_index = divmod(index, len(axis))
+            values.append(axis[value_index])
+        values.reverse()
+        return OrderedDict(
+            zip(
+                self.zipped_keys + self.keys,
+                list(self.zipped_values[zipped_index]) + values,
+            )
+        )
+
+
+class ParamGrid(Sequence):
+    """Combinations of a grid (or a list of grids) in get_combinations order.
+
+    Keys ending with `___` are zipped together instead of multiplied; every
+    zipped value runs the whole product of the remaining keys. len() fails
+    for grids of more than sys.maxsize combinations, size holds any size.
+    """
+
+    def __init__(self, param_grids):
+        if isinstance(param_grids, Mapping):
+            param_grids = [param_grids]
+        self._sub_grids = [_SubGrid(param_grid) for param_grid in param_grids]
+        self.size = sum(sub_grid.size for sub_grid in self._sub_grids)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if index >= 0:
+            for sub_grid in self._sub_grids:
+                if index < sub_grid.size:
+                    return sub_grid.combination(index)
+                index -= sub_grid.size
+        raise IndexError("ParamGrid index out of range")
+
+    def sample(self, size, strategy="random", seed=None):
+        """Returns a SampledParamGrid of at most size combinations.
+
+        random draws combinations uniformly without replacement. lhs (Latin
+        hypercube), halton and sobol spread the sample over the values of
+        every key; their points are split between grids of a list in
+        proportion to grid sizes, and combinations drawn more than once are
+        replaced with random unused ones, so the sample always has
+        min(size, len(grid)) combinations. sobol requires scipy. Memory is
+        proportional to size, not to the grid.
+        """
+        if strategy not in SAMPLING_STRATEGIES:
+            raise ValueError(
+                f"Unknown sampling strategy {strategy}, "
+                f"expected one of {SAMPLING_STRATEGIES}"
+            )
+        total = self.size
+        if size >= total:
+            return SampledParamGrid(self, range(total))
+        rng = random.Random(seed)
+        if strategy == "random":
+            if 2 * size > total:
+                # range(total) is small here
+                return SampledParamGrid(self, sorted(rng.sample(range(total), size)))
+            indices = set()
+            while len(indices) < size:
+                indices.add(rng.randrange(total))
+            return SampledParamGrid(self, sorted(indices))
+
+        indices = []
+        start = 0
+        sub_grid_sizes = [sub_grid.size for sub_grid in self._sub_grids]
+        for sub_grid, share in zip(
+            self._sub_grids, split_by_weights(size, sub_grid_sizes)
+        ):
+            count = share.stop - share.start
+            dims = sub_grid.dims
+            # dimensions of a single value take no part in the design
+            active = [d for d, dim_size in enumerate(dims) if dim_size > 1]
+            points = _unit_points(strategy, count, len(active), rng)
+            for point in points:
+                dim_indices = [0] * len(dims)
+                for d, u in zip(active, point):
+                    dim_indices[d] = min(int(u * dims[d]), dims[d] - 1)
+                indices.append(start + sub_grid.index(dim_indices))
+            start += sub_grid.size
+        unique = set(indices)
+        if len(unique) < size:
+            LOGGER.info(
+                "%d of %d sampled combinations are repeated, drawing random ones",
+                size - len(unique),
+                size,
+            )
+            while len(unique) < size:
+                unique.add(rng.randrange(total))
+        return SampledParamGrid(self, sorted(unique))
+
+
+class SampledParamGrid(Sequence):
+    """Combinations of a ParamGrid at given indices."""
+
+    def __init__(self, param_grid, indices):
+        self.param_grid = param_grid
+        if not isinstance(indices, range) and all(i < 2**63 for i in indices):
+            # indices of huge grids do not fit into a machine word
+            indices = array.array("q", indices)
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.param_grid[self.indices[index]]
+
+
+def _unit_points(strategy, count, dims, rng):
+    """count points of [0, 1)^dims of a sampling design."""
+    if dims == 0:
+        return [()] * count
+    if strategy == "lhs":
+        # every dimension gets exactly one point in each of count strata
+        strata = []
+        for _ in range(dims):
+            permutation = list(range(count))
+            rng.shuffle(permutation)
+            strata.append(permutation)
+        return [
+            tuple((strata[d][i] + rng.random()) / count for d in range(dims))
+            for i in range(count)
+        ]
+    if strategy == "halton":
+        primes = _first_primes(dims)
+        # a random shift modulo 1 makes the design depend on the seed
+        shifts = [rng.random() for _ in range(dims)]
+        return [
+            tuple(
+                (_radical_inverse(i + 1, prime) + shift) % 1.0
+                for prime, shift in zip(primes, shifts)
+            )
+            for i in range(count)
+        ]
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        LOGGER.error("Sobol sampling requires scipy, use halton otherwise")
+        raise
+    sampler = qmc.Sobol(d=dims, scramble=True, seed=rng.randrange(2**32))
+    return [tuple(point) for point in sampler.random(count)]
+
+
+def _radical_inverse(i, base):
+    result, fraction = 0.0, 1.0 / base
+    while i:
+        i, digit = divmod(i, base)
+        result += digit * fraction
+        fraction /= base
+    return result
+
+
+def _first_primes(count):
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % p for p in primes if p <= math.isqrt(candidate)):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+class ExperimentGrid(Sequence):
+    """Experiments of create_experiments_helper, built on access.
+
+    Parameters of the experiments are LayeredConfigs sharing base_config,
+    which must not be modified afterwards. Slices stay lazy; modifying a
+    returned experiment does not change the grid. Concatenation with a list
+    gives a list.
+    """
+
+    def __init__(self, param_grid, base_config, experiment_kwargs, indices=None):
+        self.param_grid = param_grid
+        self.base_config = base_config
+        self.experiment_kwargs = experiment_kwargs
+        self._indices = range(len(param_grid)) if indices is None else indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ExperimentGrid(
+                self.param_grid,
+                self.base_config,
+                self.experiment_kwargs,
+                self._indices[index],
+            )
+        return Experiment(**self._record(index), **self.experiment_kwargs)
+
+    def _record(self, index):
+        config = LayeredConfig(self.base_config, self.param_grid[self._indices[index]])
+        restore_from_path = None
+        send_code = True
+        if "restore_from_path" in config:
+            restore_from_path = config.pop("restore_from_path")
+            send_code = config.pop("send_code")
+        return dict(
+            parameters=config, restore_from_path=restore_from_path, send_code=send_code
+        )
+
+    def to_sweep(self):
+        """A Sweep of all experiments, storing fields they share once."""
+        sweep = Sweep(**self.experiment_kwargs)
+        for index in range(len(self)):
+            sweep.add(**self._record(index))
+        return sweep
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
@@ -2,19 +2,20 @@ import copy
 import os
 import pathlib
 import warnings
-from collections import OrderedDict
-from collections.abc import Mapping
-from itertools import product
 from typing import List
 
-from gitignore_parser import parse_gitignore
 from munch import Munch
 from neptune.common.utils import get_git_info
 from termcolor import colored
 
 import mrunner.plugins as plugins
-from mrunner.experiment import Experiment
-from mrunner.utils.namesgenerator import get_random_name
+from mrunner.helpers.param_grid import (  # noqa: F401
+    ExperimentGrid,
+    ParamGrid,
+    get_container_types,
+)
+from mrunner.utils.mrunnerignore import MrunnerIgnore
+from mrunner.utils.namesgenerator import get_random_name, get_unique_name
 
 
 def create_experiments_helper(
@@ -37,7 +38,25 @@ def create_experiments_helper(
     with_mpi: bool = False,
     callbacks: list = None,
     mrunner_ignore: str = None,
+    lazy_grid: bool = False,
+    compact_sweep: bool = False,
+    sample: int = None,
+    strategy: str = "random",
+    seed: int = None,
 ):
+    """Experiments of all combinations of params_grid applied to base_config.
+
+    With compact_sweep, a Sweep storing the fields shared by the experiments
+    once is returned instead of a list of experiments; it cannot be modified
+    like a list. With lazy_grid, an ExperimentGrid is returned: an experiment
+    is built only when accessed and, with the config_bundle Slurm context
+    option, the grid is shipped as its definition and every array task
+    builds its own config.
+
+    With sample, only that many combinations are drawn with the sampling
+    strategy ("random", "lhs", "halton" or "sobol", see ParamGrid.sample)
+    and seed, without enumerating the grid.
+    """
 
     assert (
         with_neptune == True or project_name is not None
@@ -87,10 +106,12 @@ def create_experiments_helper(
         if display_neptune_link:
             spec = project_name.split("/")
 
-    params_configurations = get_combinations(params_grid)
+    params_configurations = ParamGrid(params_grid)
+    if sample is not None:
+        params_configurations = params_configurations.sample(
+            sample, strategy=strategy, seed=seed
+        )
     print(colored(f"Will run {len(params_configurations)} experiments", "red"))
-    experiments = []
-
     git_info = None
     if exclude_git_files:
         exclude += [".git", ".gitignore", ".gitmodules"]
@@ -100,7 +121,8 @@ def create_experiments_helper(
             git_info.commit_date = None
 
     if mrunner_ignore:
-        exclude += find_files_with_mrunnerignore(".", mrunner_ignore)
+        # compiled and applied while the code snapshot is taken
+        mrunner_ignore = os.path.abspath(mrunner_ignore)
 
     # Last chance to change something
     for callback in callbacks:
@@ -112,131 +134,53 @@ def create_experiments_helper(
                 f"in mrunner.plugins, got {callback}"
             )
         callback(**locals())
-    for params_configuration in params_configurations:
-        config = copy.deepcopy(base_config)
-        config.update(params_configuration)
-        config = Munch(config)
-        restore_from_path = None
-        send_code = True
-        if "restore_from_path" in config:
-            restore_from_path = config.pop("restore_from_path")
-            send_code = config.pop("send_code")
-
-        experiments.append(
-            Experiment(
-                project=project_name,
-                name=experiment_name,
-                script=script,
-                parameters=config,
-                paths_to_copy=paths_to_copy,
-                tags=tags,
-                env=env,
-                exclude=exclude,
-                git_info=git_info,
-                random_name=random_name,
-                with_mpi=with_mpi,
-                restore_from_path=restore_from_path,
-                send_code=send_code,
-            )
-        )
+    experiments = ExperimentGrid(
+        params_configurations,
+        # copied once and shared by the configs of all experiments
+        copy.deepcopy(base_config),
+        dict(
+            project=project_name,
+            name=experiment_name,
+            script=script,
+            paths_to_copy=paths_to_copy,
+            tags=tags,
+            env=env,
+            exclude=exclude,
+            git_info=git_info,
+            random_name=random_name,
+            # the same in every experiment, also when built in array tasks
+            unique_name=get_unique_name(Munch(random_name=random_name)),
+            with_mpi=with_mpi,
+            mrunner_ignore=mrunner_ignore,
+        ),
+    )
+    if not lazy_grid:
+        experiments = experiments.to_sweep() if compact_sweep else list(experiments)
 
     return experiments
 
 
-def get_container_types():
-    ret = [list, tuple]
-    try:
-        import numpy as np
-
-        ret.append(np.ndarray)
-    except ImportError:
-        pass
-    try:
-        import pandas as pd
-
-        ret.append(pd.Series)
-    except ImportError:
-        pass
-    return tuple(ret)
-
-
-# TODO(pm): refactor me please
-def get_combinations(param_grids, limit=None):
+def get_combinations(
+    param_grids, limit=None, sample=None, strategy="random", seed=None
+):
     """
     Based on sklearn code for grid search. Get all hparams combinations based on
     grid(s).
     :param param_grids: dict representing hparams grid, or list of such
     mappings
+    :param sample: number of combinations drawn with strategy and seed
+    (see ParamGrid.sample) instead of all of them
     :returns: list of OrderedDict (if params_grids consisted OrderedDicts,
     the Order of parameters will be sustained.)
     """
-    allowed_container_types = get_container_types()
-    if isinstance(param_grids, Mapping):
-        # Wrap dictionary in a singleton list to support either dict or list of
-        # dicts.
-        param_grids = [param_grids]
-
-    combinations = []
-    for param_grid in param_grids:
-        items = param_grid.items()
-        if not items:
-            combinations.append(OrderedDict())
-        else:
-            keys___ = []
-            grids___ = []
-            keys = []
-            grids = []
-
-            for key, grid in items:
-                if "___" in key:
-                    keys___.append(key[:-3])
-                    grids___.append(grid)
-                else:
-                    keys.append(key)
-                    grids.append(grid)
-
-            for grid in grids + grids___:
-                assert isinstance(
-                    grid, allowed_container_types
-                ), "grid values should be passed in one of given types: {}, got {} ({})".format(
-                    allowed_container_types, type(grid), grid
-                )
-
-            if grids___:
-                for param_values___ in zip(*grids___):
-                    for param_values in product(*grids):
-                        combination = OrderedDict(
-                            zip(keys___ + keys, param_values___ + param_values)
-                        )
-                        combinations.append(combination)
-            else:
-                for param_values in product(*grids):
-                    combination = OrderedDict(zip(keys, param_values))
-                    combinations.append(combination)
-
+    combinations = ParamGrid(param_grids)
+    if sample is not None:
+        combinations = combinations.sample(sample, strategy=strategy, seed=seed)
     if limit:
         combinations = combinations[:limit]
-    return combinations
+    return list(combinations)
 
 
 def find_files_with_mrunnerignore(base_path, mrunnerignore_path):
-    # Create a GitignoreParser object
-    gitignore = parse_gitignore(mrunnerignore_path)
-
-    # List to store matched files
-    matched_paths = []
-
-    # Walk through the directory tree starting from the base path
-    for root, dirs, files in os.walk(base_path):
-        # Check if the current directory should be ignored
-        if gitignore(root):
-            matched_paths.append(os.path.relpath(root, base_path))
-            continue
-
-        # Check if each file in the current directory should be ignored
-        files = [f for f in files if gitignore(os.path.join(root, f))]
-
-        # Add the remaining files to the matched_files list
-        matched_paths.extend([os.path.join(root, f) for f in files])
-
-    return matched_paths
+    """Lists ignored files and top-most ignored directories under base_path."""
+    return MrunnerIgnore(mrunnerignore_path).ignored_paths(top=base_path)
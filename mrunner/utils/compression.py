@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import collections
+import functools
+import gzip
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger(__name__)
+
+COMPRESSIONS = ("gzip", "zstd")
+ARCHIVE_SUFFIXES = {"gzip": ".tar.gz", "zstd": ".tar.zst"}
+DEFAULT_BLOCK_SIZE = 1 << 20
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object compressing blocks with gzip in a thread pool.
+
+    Every block becomes a separate gzip member (zlib releases the GIL, so
+    blocks are compressed in parallel); concatenated members form a valid
+    gzip stream. Compressed blocks are written to fileobj in order.
+
+    With level=None the compression level adapts to the output: it goes up
+    when writing to fileobj (e.g. network) takes most of the time and down
+    when waiting for compression does.
+    """
+
+    def __init__(
+        self, fileobj, level=None, threads=None, block_size=DEFAULT_BLOCK_SIZE
+    ):
+        self._fileobj = fileobj
+        self._adaptive = level is None
+        self.level = DEFAULT_GZIP_LEVEL if level is None else level
+        self._block_size = block_size
+        threads = threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = 2 * threads
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._wait_time = 0.0
+        self._write_time = 0.0
+        self._written_blocks = 0
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[: self._block_size]))
+            del self._buffer[: self._block_size]
+        return len(data)
+
+    def close(self):
+        if self._executor is None:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._write_next()
+        self._executor.shutdown()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, block):
+        if len(self._pending) >= self._max_pending:
+            self._write_next()
+        compress = functools.partial(gzip.compress, compresslevel=self.level, mtime=0)
+        self._pending.append(self._executor.submit(compress, block))
+
+    def _write_next(self):
+        start = time.perf_counter()
+        compressed = self._pending.popleft().result()
+        compressed_at = time.perf_counter()
+        self._fileobj.write(compressed)
+        self._wait_time += compressed_at - start
+        self._write_time += time.perf_counter() - compressed_at
+        self._written_blocks += 1
+        if self._adaptive and self._written_blocks % self._max_pending == 0:
+            self._adapt_level()
+
+    def _adapt_level(self):
+        if self._write_time > 2 * self._wait_time and self.level < 9:
+            self.level += 1
+        elif self._wait_time > 2 * self._write_time and self.level > 1:
+            self.level -= 1
+        else:
+            return
+        LOGGER.debug("Changing gzip compression level to %d", self.level)
+        self._wait_time = self._write_time = 0.0
+
+
+def open_compressed_writer(fileobj, compression="gzip", level=None, threads=None):
+    """Returns a write-only file object compressing into fileobj.
+
+    The returned object has to be closed to flush the compressed stream;
+    fileobj itself is left open.
+    """
+    if compression == "gzip":
+        return ParallelGzipWriter(fileobj, level=level, threads=threads)
+    if compression == "zstd":
+        # zstandard is an optional dependency
+        try:
+            import zstandard
+        except ImportError as e:
+            LOGGER.error("Install 'zstandard' to use zstd compression.")
+            raise e
+
+        compressor = zstandard.ZstdCompressor(
+            level=DEFAULT_ZSTD_LEVEL if level is None else level,
+            threads=threads or -1,
+        )
+        return compressor.stream_writer(fileobj, closefd=False)
+
+    raise ValueError(f"Unsupported compression: {compression}")
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Single-file bundle of experiment configs, readable entry by entry.
+
+Layout (little endian)::
+
+    header:  magic, version, number of entries, offset and length of shared fields
+    table:   offset and length of every entry
+    payload: pickled shared fields, pickled per-entry fields
+
+Fields equal in all configs are stored once; an entry holds only the
+remaining fields of one config. A field holding LayeredConfigs with the same
+base in all configs (experiment parameters) is stored as the base, once, and
+the layer of every entry.
+
+A lazy bundle holds a single pickled sequence (e.g. built from a parameter
+grid) which builds the config of an index on access; its size does not
+depend on the number of configs.
+"""
+import mmap
+import struct
+
+import cloudpickle
+
+from mrunner.utils.layered_config import LayeredConfig
+
+CONFIG_BUNDLE_NAME = "config_bundle"
+MAGIC = b"MRCB"
+LAZY_MAGIC = b"MRCL"
+VERSION = 2
+HEADER = struct.Struct("<4sIQQQ")
+ENTRY = struct.Struct("<QQ")
+
+
+def _same(a, b):
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except Exception:  # e.g. numpy arrays
+        return False
+
+
+def write_config_bundle(path, configs):
+    """Writes a list of config dicts into a bundle file."""
+    first = configs[0] if configs else {}
+    shared_keys = [
+        k
+        for k, v in first.items()
+        if all(k in c and _same(c[k], v) for c in configs[1:])
+    ]
+    shared = {k: first[k] for k in shared_keys}
+    layered_keys = []
+    for k, v in first.items():
+        if k in shared or not isinstance(v, LayeredConfig):
+            continue
+        base = v.split()[0]
+        if all(
+            isinstance(c.get(k), LayeredConfig) and c[k].split()[0] is base
+            for c in configs[1:]
+        ):
+            shared[k] = LayeredConfig(base)
+            layered_keys.append(k)
+
+    with open(path, "wb") as f:
+        f.seek(HEADER.size + ENTRY.size * len(configs))
+        shared_payload = cloudpickle.dumps(shared, protocol=4)
+        shared_offset = f.tell()
+        f.write(shared_payload)
+
+        table = []
+        for config in configs:
+            delta = {k: v for k, v in config.items() if k not in shared}
+            for k in layered_keys:
+                delta[k] = config[k].split()[1:]
+            payload = cloudpickle.dumps(delta, protocol=4)
+            table.append(ENTRY.pack(f.tell(), len(payload)))
+            f.write(payload)
+
+        f.seek(0)
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, len(configs), shared_offset, len(shared_payload)
+            )
+        )
+        f.write(b"".join(table))
+
+
+def write_lazy_config_bundle(path, configs):
+    """Writes a sequence of config dicts, built on access, into a bundle file."""
+    with open(path, "wb") as f:
+        f.write(LAZY_MAGIC)
+        cloudpickle.dump(configs, f, protocol=4)
+
+
+def is_config_bundle(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) in (MAGIC, LAZY_MAGIC)
+
+
+class ConfigBundle(object):
+    """Reads bundle entries through mmap, without loading the whole file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(LAZY_MAGIC)) == LAZY_MAGIC:
+                self._lazy_configs = cloudpickle.load(f)
+                self._mmap = None
+                return
+            self._lazy_configs = None
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, shared_offset, shared_length = HEADER.unpack_from(
+            self._mmap, 0
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a config bundle (version {VERSION})")
+        self._shared_range = (shared_offset, shared_length)
+        self._shared = None
+
+    def __len__(self):
+        if self._lazy_configs is not None:
+            return len(self._lazy_configs)
+        return self._count
+
+    def __getitem__(self, index):
+        if self._lazy_configs is not None:
+            if not 0 <= index < len(self._lazy_configs):
+                raise IndexError(
+                    f"Config index {index} out of range ({len(self._lazy_configs)})"
+                )
+            return dict(self._lazy_configs[index])
+        if not 0 <= index < self._count:
+            raise IndexError(f"Config index {index} out of range ({self._count})")
+        offset, length = ENTRY.unpack_from(self._mmap, HEADER.size + index * ENTRY.size)
+        config = dict(self.shared)
+        for k, v in cloudpickle.loads(self._mmap[offset : offset + length]).items():
+            if isinstance(config.get(k), LayeredConfig):
+                # the layer of a shared base
+                v = LayeredConfig(config[k].split()[0], *v)
+            config[k] = v
+        return config
+
+    @property
+    def shared(self):
+        if self._shared is None:
+            offset, length = self._shared_range
+            self._shared = cloudpickle.loads(self._mmap[offset : offset + length])
+        return self._shared
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
@@ -7,6 +7,7 @@ import attr
 from docker.errors import ImageNotFound
 from path import Path
 
+from mrunner.utils.mrunnerignore import MrunnerIgnore
 from mrunner.utils.utils import GeneratedTemplateFile, get_paths_to_copy
 
 LOGGER = logging.getLogger(__name__)
@@ -37,8 +38,12 @@ class DockerFile(GeneratedTemplateFile):
     def __init__(self, experiment, requirements_file):
         # paths in command shall be relative
         updated_cmd = self._rewrite_paths(experiment.cwd, experiment.cmd.command)
+        exclude = experiment.exclude
+        if experiment.mrunner_ignore:
+            # COPY cannot filter, so ignored paths have to be excluded one by one
+            exclude = exclude + MrunnerIgnore(experiment.mrunner_ignore).ignored_paths()
         paths_to_copy = get_paths_to_copy(
-            exclude=experiment.exclude, paths_to_copy=experiment.paths_to_copy
+            exclude=exclude, paths_to_copy=experiment.paths_to_copy
         )
         experiment = attr.evolve(
             experiment, cmd=StaticCmd(command=updated_cmd, env=experiment.env)
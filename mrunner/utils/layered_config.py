@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Configs of a sweep sharing one base config.
+
+Experiments of a sweep differ from the base config in a few keys. A
+LayeredConfig keeps those in its own layer and reads the other keys from the
+base, which is shared by all experiments and never modified through them: a
+mutable base value (e.g. a nested dict) is copied into the layer when first
+accessed, so changes to it stay in the experiment. A config pickles as its
+base and layer; a config bundle stores a base shared by all entries once.
+
+Like Munch, keys can be read and set as attributes.
+"""
+import copy
+from collections.abc import Mapping, MutableMapping
+
+from munch import unmunchify
+
+_IMMUTABLE = (type(None), bool, int, float, complex, str, bytes)
+_MISSING = object()
+
+
+class LayeredConfig(MutableMapping):
+    """Mapping of base updated with layer, without the deleted keys."""
+
+    __slots__ = ("_base", "_layer", "_deleted")
+
+    def __init__(self, base, layer=None, deleted=()):
+        object.__setattr__(self, "_base", base)
+        object.__setattr__(self, "_layer", dict(layer) if layer else {})
+        object.__setattr__(self, "_deleted", set(deleted))
+
+    def split(self):
+        """Returns the shared base, the layer and the keys deleted from base."""
+        return self._base, self._layer, self._deleted
+
+    def _raw(self, key, default=_MISSING):
+        # a value without the copy made on access
+        if key in self._layer:
+            return self._layer[key]
+        if key in self._deleted or key not in self._base:
+            return default
+        return self._base[key]
+
+    def __getitem__(self, key):
+        value = self._raw(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        if key not in self._layer and not isinstance(value, _IMMUTABLE):
+            value = self._layer[key] = copy.deepcopy(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._layer[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._layer.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._layer or (key in self._base and key not in self._deleted)
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._layer:
+            if key not in self._base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, LayeredConfig) and other._base is self._base:
+            # the rest of both configs is the same base
+            keys = set(self._layer) | set(other._layer) | self._deleted | other._deleted
+            return all(self._raw(k) == other._raw(k) for k in keys)
+        if isinstance(other, Mapping):
+            return {k: self._raw(k) for k in self} == dict(other.items())
+        return NotImplemented
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name in LayeredConfig.__slots__:
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __reduce__(self):
+        return LayeredConfig, (self._base, self._layer, self._deleted)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, {k: self._raw(k) for k in self})
+
+    def copy(self):
+        return LayeredConfig(self._base, self._layer, self._deleted)
+
+    def toDict(self):
+        return unmunchify({k: self._raw(k) for k in self})
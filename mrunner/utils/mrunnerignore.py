@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+
+from gitignore_parser import rule_from_pattern
+
+
+class MrunnerIgnore(object):
+    """Rules of a .mrunnerignore file compiled once.
+
+    Paths are matched as strings relative to base_dir, by default the
+    directory of the ignore file (gitignore semantics, later rules override
+    earlier ones). A rule matches the ignored directory itself, not paths
+    inside it - ignored_paths and code snapshots just never descend into
+    it. A directory rule (`build/`) also matches a file named `build`.
+    """
+
+    def __init__(self, ignore_file, base_dir=None):
+        self.ignore_file = os.path.abspath(ignore_file)
+        self.base_dir = os.path.abspath(
+            base_dir if base_dir is not None else os.path.dirname(self.ignore_file)
+        )
+        rules = []
+        with open(ignore_file) as f:
+            for line_no, line in enumerate(f, start=1):
+                rule = rule_from_pattern(
+                    line.rstrip("\n"), source=(self.ignore_file, line_no)
+                )
+                if rule:
+                    rules.append((re.compile(rule.regex), rule.negation))
+        # the last matching rule decides
+        self._rules = rules[::-1]
+
+    def match_rel(self, rel_path):
+        """Checks a path relative to base_dir, with "/" separators."""
+        for regex, negation in self._rules:
+            if regex.search(rel_path):
+                return not negation
+        return False
+
+    def __call__(self, path):
+        rel_path = os.path.relpath(os.path.abspath(path), self.base_dir)
+        if rel_path == "." or rel_path.startswith(".."):
+            return False
+        return self.match_rel(rel_path.replace(os.sep, "/"))
+
+    def ignored_paths(self, top=None):
+        """Lists ignored files and top-most ignored directories under top."""
+        ignored = []
+        for root, dirs, files in os.walk(top or self.base_dir):
+            for names in (dirs, files):
+                kept = []
+                for name in names:
+                    path = os.path.join(root, name)
+                    if self(path):
+                        ignored.append(path)
+                    else:
+                        kept.append(name)
+                names[:] = kept
+        return ignored
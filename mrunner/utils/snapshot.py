@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+from collections import namedtuple
+
+from path import Path
+
+from mrunner.utils.utils import get_local_cache_dir
+
+LOGGER = logging.getLogger(__name__)
+
+DIGEST_CACHE_FILE_NAME = "digests.json"
+READ_CHUNK_SIZE = 1 << 20
+
+SnapshotEntry = namedtuple(
+    "SnapshotEntry", "local_path rel_remote_path size mode digest link_target"
+)
+
+
+def compute_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DigestCache(object):
+    """Content digests of local files, recomputed only when size or mtime changes."""
+
+    def __init__(self, path=None):
+        self._path = Path(path or get_local_cache_dir() / DIGEST_CACHE_FILE_NAME)
+        self._entries = None
+        self._dirty = False
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            try:
+                with open(self._path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def digest(self, path, st):
+        key = os.path.abspath(path)
+        cached = self.entries.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = compute_digest(path)
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest]
+        self._dirty = True
+        return digest
+
+    def save(self):
+        if not self._dirty:
+            return
+        # saved by every context of a sweep, from threads of one process
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self._path)
+        self._dirty = False
+
+
+def take_snapshot(paths_to_dump, digest_cache=None, ignore=None, with_digests=True):
+    """Expands paths returned by get_paths_to_copy into a sorted list of files.
+
+    Directories are walked recursively, symlinks are kept as links and regular
+    files get a content digest (cached in digest_cache if given, skipped
+    without with_digests). Paths matched by the ignore callable are skipped,
+    ignored directories are not entered; it applies to walked paths only,
+    paths_to_copy entries are copied whole.
+    """
+    entries = []
+
+    def _add(local_path, rel_remote_path, ignore):
+        if ignore is not None and ignore(local_path):
+            return
+        try:
+            st = os.lstat(local_path)
+        except OSError:
+            LOGGER.warning("Skipping %s: no access", local_path)
+            return
+        if stat.S_ISLNK(st.st_mode):
+            entries.append(
+                SnapshotEntry(
+                    local_path, rel_remote_path, 0, 0, None, os.readlink(local_path)
+                )
+            )
+        elif stat.S_ISDIR(st.st_mode):
+            try:
+                with os.scandir(local_path) as it:
+                    names = sorted(e.name for e in it)
+            except PermissionError:
+                LOGGER.warning("Skipping %s: no access", local_path)
+                return
+            for name in names:
+                _add(
+                    os.path.join(local_path, name),
+                    f"{rel_remote_path}/{name}" if rel_remote_path else name,
+                    ignore,
+                )
+        elif stat.S_ISREG(st.st_mode):
+            try:
+                if not with_digests:
+                    digest = None
+                elif digest_cache is not None:
+                    digest = digest_cache.digest(local_path, st)
+                else:
+                    digest = compute_digest(local_path)
+            except PermissionError:
+                LOGGER.warning("Skipping %s: no access", local_path)
+                return
+            entries.append(
+                SnapshotEntry(
+                    local_path,
+                    rel_remote_path,
+                    st.st_size,
+                    stat.S_IMODE(st.st_mode),
+                    digest,
+                    None,
+                )
+            )
+
+    for p in paths_to_dump:
+        _add(
+            str(p.local_path),
+            os.path.normpath(str(p.rel_remote_path)),
+            ignore if p.walked else None,
+        )
+
+    entries.sort(key=lambda e: e.rel_remote_path)
+    return entries
+
+
+def snapshot_digest(entries):
+    """Digest identifying the whole snapshot: paths, modes and file contents."""
+    digest = hashlib.sha1()
+    for e in entries:
+        digest.update(
+            f"{e.rel_remote_path}\0{e.mode:o}\0{e.digest or ''}\0{e.link_target or ''}\n".encode()
+        )
+    return digest.hexdigest()
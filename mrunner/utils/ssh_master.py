@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""SSH connections multiplexed over a persistent OpenSSH control master.
+
+The master process authenticates once (including interactive 2FA prompts)
+and keeps listening on a local socket after mrunner exits, so later
+invocations open sessions over it without a new handshake. It exits by
+itself after being idle for `persist`.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import attr
+
+from mrunner.utils.utils import get_local_cache_dir
+
+LOGGER = logging.getLogger(__name__)
+
+SOCKETS_DIR_NAME = "ssh"
+READ_CHUNK_SIZE = 32768
+
+
+@attr.s
+class CommandResult(object):
+    stdout = attr.ib()
+    stderr = attr.ib()
+    return_code = attr.ib()
+
+    @property
+    def ok(self):
+        return self.return_code == 0
+
+
+class ControlMasterConnection(object):
+    """Runs commands, uploads and streams through a shared control master.
+
+    Offers the subset of fabric.Connection used by the Slurm backend
+    (run and put) plus open_remote and exec_with_payload for streaming.
+    """
+
+    def __init__(self, host, persist="30m", keepalive=30, socket_path=None):
+        user_host, _, port = host.rpartition(":") if ":" in host else (host, "", "")
+        self.host = user_host
+        self.port = port or None
+        self.persist = persist
+        self.keepalive = keepalive
+        self.socket_path = socket_path or self._default_socket_path(host)
+        self._checked = False
+
+    @staticmethod
+    def _default_socket_path(host):
+        # unix socket paths are limited to ~100 chars, so use a short digest
+        sockets_dir = get_local_cache_dir() / SOCKETS_DIR_NAME
+        sockets_dir.makedirs_p()
+        sockets_dir.chmod(0o700)
+        return sockets_dir / hashlib.sha1(host.encode()).hexdigest()[:16]
+
+    def _ssh_argv(self, *args):
+        argv = ["ssh", "-S", str(self.socket_path)]
+        if self.port:
+            argv += ["-p", self.port]
+        return argv + list(args)
+
+    def is_alive(self):
+        return (
+            subprocess.run(
+                self._ssh_argv("-O", "check", self.host),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            ).returncode
+            == 0
+        )
+
+    def open(self):
+        """Makes sure a healthy master is listening, starting one if needed."""
+        if self._checked:
+            return
+        if self.is_alive():
+            LOGGER.debug("SSH: reusing control master %s", self.socket_path)
+        else:
+            if os.path.exists(self.socket_path):
+                # left behind by a master that died without cleaning up
+                os.remove(self.socket_path)
+            LOGGER.info("SSH: starting control master for %s", self.host)
+            subprocess.run(
+                self._ssh_argv(
+                    "-M",
+                    "-f",
+                    "-N",
+                    "-o",
+                    f"ControlPersist={self.persist}",
+                    "-o",
+                    f"ServerAliveInterval={self.keepalive}",
+                    "-o",
+                    "ServerAliveCountMax=3",
+                    self.host,
+                ),
+                check=True,
+            )
+        self._checked = True
+
+    def close(self):
+        """Stops the control master."""
+        subprocess.run(
+            self._ssh_argv("-O", "exit", self.host),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._checked = False
+
+    def run(self, cmd, warn=False, hide=None):
+        self.open()
+        process = subprocess.run(
+            self._ssh_argv(self.host, cmd),
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+        )
+        if hide not in (True, "both", "stdout", "out"):
+            sys.stdout.write(process.stdout)
+        if hide not in (True, "both", "stderr", "err"):
+            sys.stderr.write(process.stderr)
+        result = CommandResult(process.stdout, process.stderr, process.returncode)
+        if not warn and not result.ok:
+            raise RuntimeError(
+                f"Command '{cmd}' exited with status {result.return_code}:\n"
+                f"{result.stderr}"
+            )
+        return result
+
+    def put(self, local_path, remote_path):
+        with open(local_path, "rb") as local_file:
+            with self.open_remote(remote_path) as remote_file:
+                shutil.copyfileobj(local_file, remote_file)
+
+    @contextlib.contextmanager
+    def open_remote(self, remote_path):
+        """Yields a write-only file object streaming into remote_path."""
+        self.open()
+        process = subprocess.Popen(
+            self._ssh_argv(self.host, f"cat > {remote_path}"),
+            stdin=subprocess.PIPE,
+        )
+        try:
+            yield process.stdin
+        finally:
+            process.stdin.close()
+            return_code = process.wait()
+        if return_code != 0:
+            raise RuntimeError(
+                f"Writing remote file {remote_path} failed with status {return_code}"
+            )
+
+    def exec_with_payload(self, cmd, write_payload):
+        """Runs cmd; write_payload(fileobj) streams into its stdin.
+
+        Output is echoed and returned; a non-zero exit status raises.
+        """
+        self.open()
+        process = subprocess.Popen(
+            self._ssh_argv(self.host, cmd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        chunks = []
+
+        def _read_output():
+            for chunk in iter(lambda: process.stdout.read1(READ_CHUNK_SIZE), b""):
+                chunks.append(chunk)
+                sys.stdout.write(chunk.decode(errors="replace"))
+
+        reader = threading.Thread(target=_read_output, daemon=True)
+        reader.start()
+        write_error = None
+        try:
+            write_payload(process.stdin)
+        except OSError as e:
+            # the remote side stopped reading, its exit status tells why
+            write_error = e
+        finally:
+            with contextlib.suppress(OSError):
+                process.stdin.close()
+        reader.join()
+        return_code = process.wait()
+
+        output = b"".join(chunks).decode(errors="replace")
+        if return_code != 0:
+            raise RuntimeError(
+                f"Remote command exited with status {return_code}:\n{output}"
+            )
+        if write_error is not None:
+            raise write_error
+        return output
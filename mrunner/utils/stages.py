@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from mrunner.utils import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+# stage logs of submissions of this process by name, kept until removed
+_stage_logs = {}
+
+
+class StageLog(object):
+    """Completed stages of one submission and their results.
+
+    The log lives as long as the process, so a retry of the same submission
+    resumes from the first stage not completed; nothing is left on disk by
+    submissions that failed for good.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # contexts of a sweep are submitted from threads, with distinct names
+        self._data = _stage_logs.setdefault(name, {"values": {}, "stages": {}})
+
+    @property
+    def resumed(self):
+        return bool(self._data["stages"])
+
+    def value(self, key, factory):
+        """Returns the value saved under key, computing and saving it first if missing."""
+        if key not in self._data["values"]:
+            self._data["values"][key] = factory()
+        return self._data["values"][key]
+
+    def run(self, stage, fn):
+        if stage in self._data["stages"]:
+            LOGGER.info("Stage %s already completed, skipping", stage)
+            return self._data["stages"][stage]
+        with tracing.span(f"stage.{stage}"):
+            result = fn()
+        self._data["stages"][stage] = result
+        return result
+
+    def remove(self):
+        _stage_logs.pop(self.name, None)
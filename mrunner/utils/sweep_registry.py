@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Local records of submitted sweeps and cached states of their tasks.
+
+A sweep is identified by the job id captured at submission (the first job
+id if the sweep was split into several arrays).
+"""
+import hashlib
+import json
+import os
+import time
+
+from mrunner.utils.utils import get_local_cache_dir
+
+SWEEPS_DIR_NAME = "sweeps"
+STATUS_DIR_NAME = "status"
+
+
+def _sweeps_dir():
+    sweeps_dir = get_local_cache_dir() / SWEEPS_DIR_NAME
+    (sweeps_dir / STATUS_DIR_NAME).makedirs_p()
+    return sweeps_dir
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def register_sweep(record):
+    """Stores the record of a submitted sweep and returns its path."""
+    # job ids are unique only within a cluster
+    host_digest = hashlib.sha1(record["slurm_url"].encode()).hexdigest()[:8]
+    path = _sweeps_dir() / f"{record['job_id']}-{host_digest}.json"
+    _write_json(path, dict(record, submitted_at=time.time()))
+    return path
+
+
+def save_sweep(path, record):
+    _write_json(path, record)
+
+
+def find_sweep(sweep_id=None):
+    """Path of the record of sweep_id, or of the latest sweep if not given."""
+    pattern = f"{sweep_id}-*.json" if sweep_id else "*.json"
+    paths = _sweeps_dir().files(pattern)
+    if not paths:
+        return None
+    return max(paths, key=lambda p: p.mtime)
+
+
+def list_sweeps():
+    return sorted(_sweeps_dir().files("*.json"), key=lambda p: p.mtime)
+
+
+def load_sweep(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _status_path(record_path):
+    return record_path.dirname() / STATUS_DIR_NAME / record_path.basename()
+
+
+def load_sweep_status(record_path):
+    """Returns (update time, {task index: [state, elapsed, exit code]}) or None."""
+    try:
+        with open(_status_path(record_path)) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return status["updated"], {int(i): t for i, t in status["tasks"].items()}
+
+
+def save_sweep_status(record_path, tasks, updated=None):
+    """Saves task states; updated=0 makes the next status query the cluster."""
+    if updated is None:
+        updated = time.time()
+    _write_json(_status_path(record_path), {"updated": updated, "tasks": tasks})
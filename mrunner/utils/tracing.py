@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Timing, memory and I/O instrumentation of the submission pipeline.
+
+Code marks stages with `span(name)` and attributes counters (bytes, files,
+SSH round trips) with `count(...)` to all spans open in the current thread.
+Counters are inclusive, so count a quantity once, in the innermost span.
+Nothing is recorded until `enable()` is called (`mrunner run --trace`), so
+instrumented code costs a function call otherwise. Peak memory of a span
+is measured with tracemalloc, which slows down allocations - disable it for
+pure timing measurements.
+
+    tracing.enable()
+    with tracing.span("upload", path=str(path)):
+        tracing.count(bytes_sent=size, round_trips=1)
+    tracing.write_trace("trace.json", fmt="chrome")
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+TRACE_FORMATS = ("chrome", "json")
+
+
+class _Span(object):
+    __slots__ = (
+        "name",
+        "args",
+        "thread",
+        "parent",
+        "start",
+        "end",
+        "counters",
+        "memory_at_start",
+        "peak_memory",
+    )
+
+    def __init__(self, name, args, parent):
+        self.name = name
+        self.args = args
+        self.thread = threading.current_thread()
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end = None
+        self.counters = collections.Counter()
+        self.memory_at_start = 0
+        self.peak_memory = 0
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class _Tracer(object):
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.started_memory_tracing = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # spans of all threads, as tracemalloc peaks are process-wide
+        self._open_spans = set()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_memory_tracing = True
+
+    def stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def open(self, name, args):
+        stack = self.stack()
+        span = _Span(name, args, stack[-1] if stack else None)
+        with self._lock:
+            self._update_peaks()
+            if self.trace_memory:
+                span.memory_at_start = tracemalloc.get_traced_memory()[0]
+                span.peak_memory = span.memory_at_start
+            self._open_spans.add(span)
+            self.spans.append(span)
+        stack.append(span)
+        return span
+
+    def close(self, span):
+        with self._lock:
+            self._update_peaks()
+            self._open_spans.discard(span)
+            if self.trace_memory:
+                span.counters["peak_memory"] = span.peak_memory - span.memory_at_start
+        span.end = time.perf_counter()
+        self.stack().remove(span)
+
+    def _update_peaks(self):
+        if not self.trace_memory:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        for span in self._open_spans:
+            span.peak_memory = max(span.peak_memory, peak)
+        tracemalloc.reset_peak()
+
+    def count(self, spans, counters):
+        with self._lock:
+            for span in spans:
+                span.counters.update(counters)
+
+
+_tracer = None
+
+
+def enable(trace_memory=True):
+    """Starts recording spans, discarding the ones recorded before."""
+    global _tracer
+    disable()
+    _tracer = _Tracer(trace_memory)
+
+
+def disable():
+    global _tracer
+    if _tracer is not None and _tracer.started_memory_tracing:
+        tracemalloc.stop()
+    _tracer = None
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Records the wall time, counters and peak memory of the enclosed code."""
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    current = tracer.open(name, args)
+    try:
+        yield
+    finally:
+        tracer.close(current)
+
+
+def count(**counters):
+    """Adds counters to all spans open in the current thread."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(list(tracer.stack()), counters)
+
+
+def counted_writer(fileobj, counter="bytes_sent"):
+    """Wraps fileobj to count bytes written to it, also from other threads."""
+    tracer = _tracer
+    if tracer is None:
+        return fileobj
+    return _CountingWriter(fileobj, tracer, list(tracer.stack()), counter)
+
+
+class _CountingWriter(object):
+    def __init__(self, fileobj, tracer, spans, counter):
+        self._fileobj = fileobj
+        self._tracer = tracer
+        self._spans = spans
+        self._counter = counter
+
+    def write(self, data):
+        self._tracer.count(self._spans, {self._counter: len(data)})
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+def _records(tracer):
+    origin = min((s.start for s in tracer.spans), default=0.0)
+    records = []
+    indexes = {}
+    for index, s in enumerate(tracer.spans):
+        indexes[id(s)] = index
+        records.append(
+            {
+                "name": s.name,
+                "args": s.args,
+                "thread": s.thread.name,
+                "thread_id": s.thread.ident,
+                "parent": indexes.get(id(s.parent)),
+                "start": s.start - origin,
+                "duration": s.duration,
+                "counters": dict(s.counters),
+            }
+        )
+    return records
+
+
+def _chrome_events(records):
+    events = []
+    for thread_id, thread_name in {
+        r["thread_id"]: r["thread"] for r in records
+    }.items():
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": thread_id,
+                "args": {"name": thread_name},
+            }
+        )
+    for r in records:
+        events.append(
+            {
+                "name": r["name"],
+                "cat": "mrunner",
+                "ph": "X",
+                "ts": r["start"] * 1e6,
+                "dur": r["duration"] * 1e6,
+                "pid": os.getpid(),
+                "tid": r["thread_id"],
+                "args": dict(r["args"], **r["counters"]),
+            }
+        )
+    return events
+
+
+def write_trace(path, fmt="chrome"):
+    """Writes the spans recorded so far as a Chrome trace or a list of spans.
+
+    Chrome traces open in chrome://tracing or https://ui.perfetto.dev.
+    Counters are inclusive (a span counts the bytes of its children) and
+    peak_memory is the highest memory traced by tracemalloc during a span
+    above the memory traced when it started.
+    """
+    if fmt not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format {fmt}, expected one of {TRACE_FORMATS}")
+    records = _records(_tracer) if _tracer is not None else []
+    if fmt == "chrome":
+        data = {"traceEvents": _chrome_events(records), "displayTimeUnit": "ms"}
+    else:
+        data = {"spans": records}
+    with open(path, "w") as f:
+        json.dump(data, f, default=str)
+
+
+def summary():
+    """Spans aggregated by name, in the order they first started.
+
+    Returns a list of (name, calls, total seconds, counters) where counters
+    are summed, except peak_memory which is the maximum.
+    """
+    if _tracer is None:
+        return []
+    rows = {}
+    for s in _tracer.spans:
+        calls, total, counters = rows.get(s.name, (0, 0.0, collections.Counter()))
+        peak = max(counters["peak_memory"], s.counters["peak_memory"])
+        counters.update(s.counters)
+        if peak:
+            counters["peak_memory"] = peak
+        rows[s.name] = (calls + 1, total + s.duration, counters)
+    return [(name, *row) for name, row in rows.items()]
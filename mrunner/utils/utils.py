@@ -1,4 +1,5 @@
 import logging
+import os
 import re
 from collections import OrderedDict, namedtuple
 from tempfile import NamedTemporaryFile
@@ -10,6 +11,7 @@ from jinja2 import Environment, PackageLoader, StrictUndefined
 from path import Path
 
 from mrunner.backends import get_context_cls
+from mrunner.utils.config_bundle import CONFIG_BUNDLE_NAME
 
 LOGGER = logging.getLogger(__name__)
 
@@ -18,6 +20,27 @@ def pathify(path, separator="-"):
     return re.sub(r"[ ]+", separator, path.lower())
 
 
+def parse_size(size):
+    """Parses sizes like 512, "100M" or "2G" into bytes."""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", str(size), re.I)
+    if match is None:
+        raise ValueError(f"Invalid size: {size}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** "_KMGT".index(unit.upper() or "_"))
+
+
+def format_size(size):
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TiB"
+    return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+
+
 def parse_argv(parser, argv):
     try:
         divider_pos = argv.index("--")
@@ -30,6 +53,16 @@ def parse_argv(parser, argv):
     return parser.parse_args(args=mrunner_argv), rest_argv
 
 
+def get_local_cache_dir():
+    """Directory keeping mrunner state between invocations (digest caches, etc.)."""
+    cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache_dir = Path(
+        os.environ.get("MRUNNER_CACHE_DIR") or Path(cache_root) / "mrunner"
+    )
+    cache_dir.makedirs_p()
+    return cache_dir
+
+
 template_env = Environment(
     loader=PackageLoader("mrunner", "templates"), undefined=StrictUndefined
 )
@@ -58,7 +91,10 @@ class GeneratedTemplateFile(TempFile):
         self.write(payload)
 
 
-PathToDump = namedtuple("PathToDump", "local_path rel_remote_path")
+# walked: listed from the current working directory, not given in paths_to_copy
+PathToDump = namedtuple(
+    "PathToDump", "local_path rel_remote_path walked", defaults=(False,)
+)
 
 
 @attr.s
@@ -66,6 +102,7 @@ class WrapperCmd(object):
 
     _cmd = attr.ib()
     _experiment_config_path = attr.ib()
+    _config_bundle = attr.ib(default=False)
 
     @property
     def command(self):
@@ -74,39 +111,79 @@ class WrapperCmd(object):
             if isinstance(self._cmd, six.string_types)
             else self._cmd
         )
-        config_argv = ["--config", "config_$SLURM_ARRAY_TASK_ID"]
+        if self._config_bundle:
+            config_argv = [
+                "--config",
+                CONFIG_BUNDLE_NAME,
+                "--config_index",
+                "$MRUNNER_TASK_ID",
+            ]
+        else:
+            config_argv = ["--config", "config_$MRUNNER_TASK_ID"]
         cmd = cmd + config_argv
         return " ".join(cmd)
 
 
-def get_paths_to_copy(paths_to_copy=None, exclude=None):
+_EXCLUDED = object()
+
+
+def _build_exclude_trie(exclude):
+    """Prefix trie of excluded paths (relative to cwd), leaves mark excluded subtrees."""
+    trie = {}
+    for e in exclude:
+        rel_path = os.path.relpath(os.path.abspath(e))
+        if rel_path == "." or rel_path.startswith(".."):
+            continue
+        *parents, name = rel_path.split(os.sep)
+        node = trie
+        for part in parents:
+            node = node.setdefault(part, {})
+            if node is _EXCLUDED:
+                break
+        else:
+            node[name] = _EXCLUDED
+    return trie
+
+
+def get_paths_to_copy(paths_to_copy=None, exclude=None, ignore=None):
     """Lists paths to copy from current working directory, after excluding paths from exclude list;
-    additionally paths_to_copy are copied"""
+    additionally paths_to_copy are copied
+
+    Entries of the current working directory are listed as a whole, only
+    directories containing excluded paths are expanded. Exclusions are
+    compiled into a prefix trie, so the cost does not depend on how many
+    excludes there are. Entries matched by the ignore callable (e.g.
+    MrunnerIgnore) are skipped as well; it is not applied inside the listed
+    directories nor to paths_to_copy, which are always copied.
+    """
 
     if paths_to_copy is None:
         paths_to_copy = []
     if exclude is None:
         exclude = [".git", ".gitignore", ".gitmodules"]
-    exclude = [Path(e).abspath() for e in exclude]
-
-    def _list_dir(d):
-        directories = []
-        for p in Path(d).listdir():
-            p = p.abspath()
-            excluded = False
-            for e in exclude:
-                e = Path(e).abspath()
-                if not e.relpath(p).startswith(".."):
-                    excluded = True
-                    # if excluded subdir - not whole current
-                    if e != p:
-                        directories += _list_dir(p)
-                    break
-            if not excluded:
-                directories.append(PathToDump(p.relpath("."), p.relpath(".")))
-        return directories
-
-    result = _list_dir(Path("."))
+    exclude_trie = _build_exclude_trie(exclude)
+
+    result = []
+
+    def _list_dir(dir_path, rel_dir, node):
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                child = node.get(entry.name)
+                if ignore is not None and ignore(rel_path):
+                    continue
+                if child is None:
+                    result.append(rel_path)
+                elif child is _EXCLUDED:
+                    continue
+                elif entry.is_dir():
+                    # excluded subdir - not whole current
+                    _list_dir(entry.path, rel_path, child)
+                else:
+                    result.append(rel_path)
+
+    _list_dir(".", "", exclude_trie)
+    result = [PathToDump(Path(p), Path(p), walked=True) for p in result]
     for external in paths_to_copy:
         if ":" in external:
             src, rel_dst = external.split(":")
@@ -122,12 +199,14 @@ def get_paths_to_copy(paths_to_copy=None, exclude=None):
             )
         result.append(PathToDump(Path(src).relpath("."), Path(rel_dst).relpath(".")))
 
-    result = set(result)
+    # an entry also given in paths_to_copy is not ignored
+    unique = {(p.local_path, p.rel_remote_path): p for p in result}
+    result = sorted(unique.values())
     LOGGER.debug(
         "get_paths_to_copy(paths_to_copy=%s, exclude=%s) result=%s",
         str(paths_to_copy),
         str(exclude),
-        str([str(s) for s, d in result]),
+        str([str(p.local_path) for p in result]),
     )
     return result
 
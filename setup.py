@@ -31,5 +31,6 @@ setup(
     extras_require={
         "dev": ["black", "isort", "pre-commit"],
         "doc": ["sphinx-rtd-theme", "sphinx", "myst_parser"],
+        "zstd": ["zstandard"],
     },
 )
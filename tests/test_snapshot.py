@@ -0,0 +1,41 @@
+from mrunner.utils.mrunnerignore import MrunnerIgnore
+from mrunner.utils.snapshot import take_snapshot
+from mrunner.utils.utils import get_paths_to_copy
+
+
+def _snapshot_paths(paths_to_copy, ignore):
+    paths_to_dump = get_paths_to_copy(paths_to_copy=paths_to_copy, ignore=ignore)
+    return [
+        e.rel_remote_path
+        for e in take_snapshot(paths_to_dump, ignore=ignore, with_digests=False)
+    ]
+
+
+def test_mrunnerignore_does_not_filter_paths_to_copy(tmp_path, monkeypatch):
+    (tmp_path / "data" / "small").mkdir(parents=True)
+    (tmp_path / "data" / "small" / "x.bin").write_text("x")
+    (tmp_path / "data" / "big.bin").write_text("y")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "train.py").write_text("")
+    (tmp_path / ".mrunnerignore").write_text("data/\n*.pyc\n")
+    (tmp_path / "src" / "train.pyc").write_text("")
+    monkeypatch.chdir(tmp_path)
+    ignore = MrunnerIgnore(".mrunnerignore")
+
+    paths = _snapshot_paths(["data/small:data/small"], ignore)
+
+    assert "data/small/x.bin" in paths
+    assert "data/big.bin" not in paths
+    assert "src/train.py" in paths
+    assert "src/train.pyc" not in paths
+
+
+def test_explicit_path_inside_walked_tree_is_copied_whole(tmp_path, monkeypatch):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "weights.pyc").write_text("w")
+    (tmp_path / ".mrunnerignore").write_text("*.pyc\n")
+    monkeypatch.chdir(tmp_path)
+    ignore = MrunnerIgnore(".mrunnerignore")
+
+    assert "assets/weights.pyc" not in _snapshot_paths([], ignore)
+    assert "assets/weights.pyc" in _snapshot_paths(["assets"], ignore)